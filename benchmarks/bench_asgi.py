@@ -0,0 +1,125 @@
+"""
+Compare the WSGI (threaded Werkzeug server, one event loop per request) & ASGI (uvicorn, app-lifetime event loop)
+deployments of the job matching endpoint, offline against the local LinkedIn stand-in server.
+
+Every request searches different keywords so no request is answered from the requirements cache of another.
+
+Usage:
+    python -m benchmarks.bench_asgi --requests 40 --concurrency 10 --latency 0.05 --output asgi.json
+"""
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+
+import httpx
+import uvicorn
+from werkzeug.serving import make_server
+
+from benchmarks.bench_job_matching import app, setup_app, percentile, reset_cache, get_version, EMPLOYEE_CRITERIA
+from benchmarks.fake_linkedin import serve
+from web.asgi import application
+
+
+@contextmanager
+def serve_wsgi(port: int):
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+@contextmanager
+def serve_asgi(port: int):
+    server = uvicorn.Server(uvicorn.Config(application, host='127.0.0.1', port=port, log_level='warning',
+                                           access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f'The ASGI server failed to start on port {port}')
+        time.sleep(0.05)
+    try:
+        yield
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+SERVERS = {'wsgi': serve_wsgi, 'asgi': serve_asgi}
+
+
+async def send_requests(url: str, headers: dict, requests: int, concurrency: int, limit: int, mode: str) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def send(client, index):
+        nonlocal errors
+        data = {'location': 'United States', 'keywords': f'{mode} {index}', 'education': EMPLOYEE_CRITERIA['education'],
+                'skills': ','.join(EMPLOYEE_CRITERIA['skills']), 'start': 1, 'limit': limit}
+        async with semaphore:
+            started_at = time.perf_counter()
+            # The endpoint reads the criteria from the form data of a GET request
+            response = await client.request('GET', url, data=data, headers=headers)
+            latencies.append(time.perf_counter() - started_at)
+            errors += response.status_code != 200
+
+    async with httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=concurrency)) as client:
+        started_at = time.perf_counter()
+        await asyncio.gather(*(send(client, index) for index in range(requests)))
+        total_time = time.perf_counter() - started_at
+
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': requests / total_time,
+        'latency_ms': {
+            'p50': percentile(latencies, 50) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'mean': sum(latencies) / len(latencies) * 1000,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument('--requests', type=int, default=40, help='requests sent to each server')
+    parser.add_argument('--concurrency', type=int, default=10, help='requests in flight')
+    parser.add_argument('--limit', type=int, default=25, help='jobs matched by each request')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to each fake LinkedIn response')
+    parser.add_argument('--fetch-rate', type=float, default=10000, help='override FETCH_RATE (requests per second)')
+    parser.add_argument('--port', type=int, default=8001, help='port of the fake LinkedIn server')
+    parser.add_argument('--app-port', type=int, default=8002, help='port of the benchmarked server')
+    parser.add_argument('--output', help='path of the JSON report')
+    args = parser.parse_args()
+
+    headers = setup_app(args.port, args.fetch_rate)
+    report = {'version': get_version(), 'options': vars(args), 'modes': {}}
+    url = f'http://127.0.0.1:{args.app_port}/api/job-matching'
+    with serve(args.port, latency=args.latency):
+        for mode in args.modes:
+            with app.app_context():
+                reset_cache()
+            with SERVERS[mode](args.app_port):
+                result = asyncio.run(send_requests(url, headers, args.requests, args.concurrency, args.limit, mode))
+            report['modes'][mode] = result
+            print(f'{mode}: {result["throughput_rps"]:.1f} requests/s, p50 {result["latency_ms"]["p50"]:.0f} ms, '
+                  f'p99 {result["latency_ms"]["p99"]:.0f} ms, {result["errors"]} errors')
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+Offline benchmark of the job matching endpoint against the local LinkedIn stand-in server.
+
+Each scenario matches a total number of jobs: 25 & 250 jobs are a single request, larger scenarios send concurrent
+requests of 250 jobs with different keywords. The end-to-end throughput, the p50/p99 latency & the time spent in each
+stage (from the `Server-Timing` header) are measured, along with microbenchmarks of the parsing, extraction & scoring
+functions. The results are written as a JSON report that can be compared with the report of another version.
+
+Usage:
+    python -m benchmarks.bench_job_matching --scenarios 25 250 2500 --output report.json
+    python -m benchmarks.bench_job_matching --latency 0.2 --error-rate 0.01 --compare baseline.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import platform
+import argparse
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///benchmark.db')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ.setdefault('JWT_SECRET_KEY', 'benchmark')
+
+import httpx
+from flask_jwt_extended import create_access_token
+
+from web import app, db
+from web.models import User, JobCache
+from web.cache import job_cache, search_cache
+from web.fetcher import fetcher
+from web.parser import parse_search_response, parse_detail_html, PARSER_BACKENDS
+from web.utils import extract_job_requirements, extract_jobs_requirements, calculate_matching_score
+from web.matching import calculate_matching_scores
+from web.matcher import match_job_descriptions
+from benchmarks.fake_linkedin import serve
+
+# Most jobs matched by one request, the form caps the limit
+REQUEST_LIMIT = 250
+
+EMPLOYEE_CRITERIA = {'skills': ['Python', 'SQL', 'Data Analysis', 'Docker'], 'education': "Bachelor's Degree"}
+
+
+def percentile(values: list, percent: float) -> float:
+    """
+    Return the nearest-rank percentile of the given values.
+    """
+    values = sorted(values)
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def parse_server_timing(header: str) -> dict:
+    timings = {}
+    for timing in filter(None, (header or '').split(', ')):
+        stage, _, duration = timing.partition(';dur=')
+        timings[stage] = float(duration)
+    return timings
+
+
+def measure(func, number: int = 10, repeat: int = 3) -> float:
+    """
+    Return the best mean time of one call in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started_at) / number)
+    return min(timings) * 1000
+
+
+def get_version() -> str:
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def reset_cache():
+    search_cache.clear()
+    job_cache.memory.clear()
+    JobCache.query.delete()
+    db.session.commit()
+
+
+def setup_app(port: int, fetch_rate: float = None) -> dict:
+    """
+    Point the application to the fake LinkedIn server on the given port & create the benchmark user.
+    Returns the authorization headers of the user.
+    """
+    app.config.update({
+        'LINKEDIN_BASE_URL': f'http://127.0.0.1:{port}',
+        'SERVER_TIMING': True,
+        'SEARCH_MAX_PAGES': math.ceil(REQUEST_LIMIT / app.config['SEARCH_PAGE_SIZE']),
+        # Measure the whole matching, instead of the partial results answered once the deadline runs out
+        'REQUEST_DEADLINE': 0,
+    })
+    if fetch_rate is not None:
+        fetcher.rate = fetcher.burst = fetch_rate
+
+    with app.app_context():
+        db.create_all()
+        user = User.query.filter_by(email='benchmark@example.com').first()
+        if user is None:
+            user = User.create_user(email='benchmark@example.com', password='benchmark', username='benchmark')
+            db.session.add(user)
+            db.session.commit()
+        return {'Authorization': 'Bearer ' + create_access_token(identity=user.id)}
+
+
+def run_scenario(client, headers: dict, jobs: int, rounds: int, warm: bool) -> dict:
+    """
+    Match ``jobs`` jobs ``rounds`` times, sending concurrent requests of at most ``REQUEST_LIMIT`` jobs.
+    """
+    requests_count = math.ceil(jobs / REQUEST_LIMIT)
+    limit = min(jobs, REQUEST_LIMIT)
+    latencies, stages, errors, partial, wall_times = [], {}, 0, 0, []
+
+    def send(index):
+        data = {'location': 'United States', 'keywords': f'benchmark {index}', 'education': "Bachelor's Degree",
+                'skills': ','.join(EMPLOYEE_CRITERIA['skills']), 'start': 1, 'limit': limit}
+        started_at = time.perf_counter()
+        response = client.get('/api/job-matching', data=data, headers=headers)
+        return time.perf_counter() - started_at, response
+
+    with ThreadPoolExecutor(max_workers=requests_count) as executor:
+        for _ in range(rounds):
+            if not warm:
+                reset_cache()
+            started_at = time.perf_counter()
+            for latency, response in executor.map(send, range(requests_count)):
+                latencies.append(latency)
+                errors += response.status_code != 200
+                partial += response.status_code == 200 and response.json.get('partial', False)
+                for stage, duration in parse_server_timing(response.headers.get('Server-Timing')).items():
+                    stages.setdefault(stage, []).append(duration)
+            wall_times.append(time.perf_counter() - started_at)
+
+    total_time = sum(wall_times)
+    return {
+        'jobs': jobs,
+        'requests': len(latencies),
+        'concurrency': requests_count,
+        'errors': errors,
+        'partial': partial,
+        'throughput_rps': len(latencies) / total_time,
+        'jobs_per_second': jobs * rounds / total_time,
+        'latency_ms': {
+            'p50': percentile(latencies, 50) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'mean': sum(latencies) / len(latencies) * 1000,
+        },
+        'stages_ms': {stage: sum(durations) / len(durations) for stage, durations in stages.items()},
+    }
+
+
+def run_micro(server) -> dict:
+    """
+    Microbenchmark the parsing, extraction & scoring functions on their own, over generated LinkedIn pages.
+    """
+    search_response = httpx.Response(200, text=server.render_search('micro', 1))
+    jobs = parse_search_response(search_response)
+    descriptions = [parse_detail_html(server.render_detail(i)) for i in range(1, len(jobs) + 1)]
+    jobs_requirements = extract_jobs_requirements(descriptions) * 10
+
+    return {
+        'parse_search_response': {backend: measure(lambda: parse_search_response(search_response, backend))
+                                  for backend in PARSER_BACKENDS},
+        'extract_job_requirements': {
+            'per_description': measure(lambda: [extract_job_requirements(d) for d in descriptions], number=1),
+            'batch': measure(lambda: extract_jobs_requirements(descriptions), number=1),
+        },
+        'calculate_matching_score': {
+            'per_job': measure(lambda: [calculate_matching_score(EMPLOYEE_CRITERIA, job_requirements)
+                                        for job_requirements in jobs_requirements]),
+            'vectorized': measure(lambda: calculate_matching_scores(EMPLOYEE_CRITERIA, jobs_requirements)),
+        },
+        'match_job_descriptions': {
+            'extract_and_score': measure(lambda: calculate_matching_scores(
+                EMPLOYEE_CRITERIA, extract_jobs_requirements(descriptions)), number=1),
+            'phrase_matcher': measure(lambda: match_job_descriptions(EMPLOYEE_CRITERIA, descriptions), number=1),
+        },
+        'sizes': {'search_cards': len(jobs), 'descriptions': len(descriptions), 'scored_jobs': len(jobs_requirements)},
+    }
+
+
+def compare(report: dict, baseline: dict):
+    """
+    Print the relative change of the main measures between the baseline & the current report.
+    """
+    print(f'\nCompared with {baseline["version"]} (negative is faster):')
+    for jobs, scenario in report['scenarios'].items():
+        base = baseline['scenarios'].get(jobs)
+        if base is None:
+            continue
+        for measure_name in ('p50', 'p99'):
+            change = scenario['latency_ms'][measure_name] / base['latency_ms'][measure_name] - 1
+            print(f'  {jobs:>5} jobs {measure_name} latency: {change:+.1%}')
+        change = scenario['jobs_per_second'] / base['jobs_per_second'] - 1
+        print(f'  {jobs:>5} jobs throughput: {change:+.1%} (positive is better)')
+    for function, timings in report.get('micro', {}).items():
+        for variant, value in timings.items():
+            base = baseline.get('micro', {}).get(function, {}).get(variant)
+            if variant != 'sizes' and function != 'sizes' and base:
+                print(f'  {function} [{variant}]: {value / base - 1:+.1%}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', type=int, nargs='+', default=[25, 250, 2500], help='jobs matched per scenario')
+    parser.add_argument('--rounds', type=int, default=3, help='runs of each scenario')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to each fake LinkedIn response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='ratio of failing fake LinkedIn responses')
+    parser.add_argument('--fetch-rate', type=float, default=None, help='override FETCH_RATE (requests per second)')
+    parser.add_argument('--warm', action='store_true', help='keep the search & requirements caches between rounds')
+    parser.add_argument('--skip-micro', action='store_true', help='skip the microbenchmarks')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--output', help='path of the JSON report')
+    parser.add_argument('--compare', help='path of a previous JSON report to compare with')
+    args = parser.parse_args()
+
+    headers = setup_app(args.port, args.fetch_rate)
+
+    report = {
+        'version': get_version(),
+        'created_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'options': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'scenarios': {},
+    }
+    client = app.test_client()
+    with serve(args.port, latency=args.latency, error_rate=args.error_rate) as server:
+        with app.app_context():
+            for jobs in args.scenarios:
+                scenario = run_scenario(client, headers, jobs, args.rounds, args.warm)
+                report['scenarios'][str(jobs)] = scenario
+                print(f'{jobs:>5} jobs: p50 {scenario["latency_ms"]["p50"]:.0f} ms, '
+                      f'p99 {scenario["latency_ms"]["p99"]:.0f} ms, {scenario["jobs_per_second"]:.1f} jobs/s, '
+                      f'{scenario["errors"]} errors, {scenario["partial"]} partial, stages (ms) '
+                      + ', '.join(f'{stage} {duration:.0f}' for stage, duration in scenario['stages_ms'].items()))
+            reset_cache()
+        if not args.skip_micro:
+            report['micro'] = run_micro(server)
+            print(json.dumps(report['micro'], indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(report, json.load(file))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Benchmark of the vectorized matching engine against the per-job `calculate_matching_score` loop.
+
+Usage:
+    python -m benchmarks.bench_matching --sizes 1000 10000 100000
+"""
+import os
+import time
+import random
+import argparse
+
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///benchmark.db')
+
+from web.utils import calculate_matching_score
+from web.matching import JobIndex, calculate_records_scores
+from web.records import JobRecord, TermVocabulary
+
+
+def generate_jobs_requirements(size: int, vocabulary_size: int = 5000, terms_per_job: int = 60, seed: int = 0):
+    rng = random.Random(seed)
+    vocabulary = [f'term {i}' for i in range(vocabulary_size)]
+    return [rng.sample(vocabulary, terms_per_job) for _ in range(size)]
+
+
+def measure(func, repeat: int) -> float:
+    """
+    Return the best wall time of the given function over ``repeat`` runs.
+    """
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started_at)
+    return min(timings)
+
+
+def run(sizes, repeat: int):
+    """
+    Print the time of the loop, of building the index, of scoring with the built index & of scoring the interned
+    records one by one. The index is only faster when it is built once & scored many times, the live requests score
+    a single criteria with the records instead.
+    """
+    employee_criteria = {'skills': ['term 1', 'term 2', 'term 3', 'term 4', 'term 5'], 'education': 'term 6'}
+    print(f'{"jobs":>8} {"loop (s)":>10} {"index (s)":>10} {"score (s)":>10} {"records (s)":>12} '
+          f'{"reused":>7} {"built":>7} {"records":>8}')
+    for size in sizes:
+        jobs_requirements = generate_jobs_requirements(size)
+        loop_time = measure(lambda: [calculate_matching_score(employee_criteria, job_requirements)
+                                     for job_requirements in jobs_requirements], repeat)
+        index_time = measure(lambda: JobIndex(jobs_requirements), repeat)
+        index = JobIndex(jobs_requirements)
+        score_time = measure(lambda: index.score(employee_criteria), repeat)
+        vocabulary = TermVocabulary()
+        records = [JobRecord(str(i), 'title', 'company', term_ids=vocabulary.intern(job_requirements))
+                   for i, job_requirements in enumerate(jobs_requirements)]
+        records_time = measure(lambda: calculate_records_scores(employee_criteria, records, vocabulary), repeat)
+        # Make sure the implementations agree before reporting
+        expected = [calculate_matching_score(employee_criteria, job_requirements)
+                    for job_requirements in jobs_requirements]
+        assert index.score(employee_criteria).tolist() == expected
+        assert calculate_records_scores(employee_criteria, records, vocabulary) == expected
+        # Speedups over the loop, of the reused index, of the index built & scored once & of the records
+        print(f'{size:>8} {loop_time:>10.4f} {index_time:>10.4f} {score_time:>10.4f} {records_time:>12.4f} '
+              f'{loop_time / score_time:>6.1f}x {loop_time / (index_time + score_time):>6.1f}x '
+              f'{loop_time / records_time:>7.1f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
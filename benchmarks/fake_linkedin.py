@@ -0,0 +1,158 @@
+"""
+Local stand-in for the LinkedIn guest jobs API, serving pages generated from the recorded fixtures.
+
+The search endpoint returns pages of 25 job cards linking back to this server, each distinct `keywords` value gets its
+own ``jobs`` postings so concurrent searches do not share them. Every job has a detail page with a generated
+description. Latency & error rate are configurable to reproduce slow or flaky upstream conditions.
+
+Usage:
+    python -m benchmarks.fake_linkedin --port 8001 --jobs 1000 --latency 0.2 --error-rate 0.01
+"""
+import re
+import html
+import zlib
+import random
+import asyncio
+import argparse
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from urllib.parse import parse_qs
+
+import uvicorn
+
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / 'fixtures' / 'linkedin'
+
+SKILLS = ['Python', 'SQL', 'Data Analysis', 'Flask', 'Django', 'Docker', 'Kubernetes', 'AWS', 'React', 'Java',
+          'Machine Learning', 'Excel', 'Tableau', 'Spark', 'Airflow', 'Go', 'Rust', 'TypeScript', 'PostgreSQL', 'Git']
+TITLES = ['Python Developer', 'Data Analyst', 'Backend Engineer', 'Data Engineer', 'Machine Learning Engineer',
+          'Software Engineer', 'DevOps Engineer', 'Full Stack Developer']
+COMPANIES = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark Industries', 'Wayne Enterprises', 'Vandelay']
+EDUCATIONS = ["Bachelor's Degree", "Master's Degree", 'PhD']
+
+
+def load_templates():
+    """
+    Build the card & detail page templates out of the recorded LinkedIn pages.
+    """
+    search_html = (FIXTURES_DIR / 'search.html').read_text(encoding='utf-8')
+    card = re.search(r'<li>.*?</li>', search_html, re.S).group(0)
+    card = re.sub(r'href="https://www\.linkedin\.com/jobs/view/[^"]+"', 'href="__LINK__"', card, count=1)
+    card = card.replace('Python Developer', '__TITLE__').replace('Acme', '__COMPANY__')
+
+    detail_html = (FIXTURES_DIR / 'detail.html').read_text(encoding='utf-8')
+    detail = re.sub(r'(<div class="show-more-less-html__markup[^>]*>).*?(</div>)', r'\1__DESCRIPTION__\2',
+                    detail_html, count=1, flags=re.S)
+    detail = detail.replace('Python Developer', '__TITLE__').replace('Acme', '__COMPANY__')
+    return card, detail
+
+
+class FakeLinkedIn:
+    """
+    ASGI application serving ``jobs`` generated postings per search keywords, each response is delayed by
+    ``latency`` seconds (+/- ``jitter`` ratio) & fails with a 503 status with an ``error_rate`` probability.
+    """
+
+    page_size = 25
+
+    def __init__(self, base_url: str, jobs: int = 1000, latency: float = 0.0, jitter: float = 0.5,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.base_url = base_url.rstrip('/')
+        self.jobs = jobs
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.card_template, self.detail_template = load_templates()
+        self.requests = 0
+
+    def get_job(self, job_id: int) -> dict:
+        rng = random.Random(job_id)
+        return {
+            'title': rng.choice(TITLES),
+            'company': rng.choice(COMPANIES),
+            'skills': rng.sample(SKILLS, rng.randint(3, 8)),
+            'education': rng.choice(EDUCATIONS),
+        }
+
+    def render_search(self, keywords: str, start: int) -> str:
+        # The postings of each keywords value get their own range of ids
+        offset = zlib.crc32(keywords.encode('utf-8')) * 10 ** 6
+        cards = []
+        for position in range(max(start, 1), min(start + self.page_size, self.jobs + 1)):
+            job_id = offset + position
+            job = self.get_job(job_id)
+            cards.append(self.card_template
+                         .replace('__LINK__', f'{self.base_url}/jobs/view/{job_id}?refId=benchmark&amp;position=1')
+                         .replace('__TITLE__', html.escape(job['title']))
+                         .replace('__COMPANY__', html.escape(job['company'])))
+        return '\n'.join(cards)
+
+    def render_detail(self, job_id: int) -> str:
+        job = self.get_job(job_id)
+        description = (f'<p><strong>About {html.escape(job["company"])}</strong></p>'
+                       f'<p>We are hiring a {html.escape(job["title"])} to join our growing team.</p>'
+                       f'<ul>{"".join(f"<li>Experience with {html.escape(skill)}</li>" for skill in job["skills"])}'
+                       f'</ul><p>{html.escape(job["education"])} in Computer Science or a related field.</p>')
+        return (self.detail_template
+                .replace('__DESCRIPTION__', description)
+                .replace('__TITLE__', html.escape(job['title']))
+                .replace('__COMPANY__', html.escape(job['company'])))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                await send({'type': message['type'] + '.complete'})
+                if message['type'] == 'lifespan.shutdown':
+                    return
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * self.random.uniform(1 - self.jitter, 1 + self.jitter))
+
+        path = scope['path']
+        status, body = 404, 'Not Found'
+        if self.random.random() < self.error_rate:
+            status, body = 503, 'Service Unavailable'
+        elif path == '/jobs-guest/jobs/api/seeMoreJobPostings/search':
+            query = parse_qs(scope['query_string'].decode())
+            status, body = 200, self.render_search(query.get('keywords', [''])[0], int(query.get('start', ['0'])[0]))
+        elif path.startswith('/jobs/view/') and path.rsplit('/', 1)[-1].isdigit():
+            status, body = 200, self.render_detail(int(path.rsplit('/', 1)[-1]))
+
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'text/html; charset=utf-8')]})
+        await send({'type': 'http.response.body', 'body': body.encode('utf-8')})
+
+
+@contextmanager
+def serve(port: int = 8001, **kwargs):
+    """
+    Run the fake LinkedIn server in a background thread for the duration of the context, yields the application.
+    """
+    application = FakeLinkedIn(f'http://127.0.0.1:{port}', **kwargs)
+    server = uvicorn.Server(uvicorn.Config(application, host='127.0.0.1', port=port, log_level='warning',
+                                           access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f'The fake LinkedIn server failed to start on port {port}')
+        threading.Event().wait(0.05)
+    try:
+        yield application
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--jobs', type=int, default=1000, help='postings found by each search keywords')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='ratio of responses failing with 503')
+    args = parser.parse_args()
+    uvicorn.run(FakeLinkedIn(f'http://127.0.0.1:{args.port}', jobs=args.jobs, latency=args.latency,
+                             error_rate=args.error_rate), host='127.0.0.1', port=args.port)
@@ -1,5 +1,9 @@
 from web import app, DEBUG
+from web.tasks import task_runner
+from web.ingest import start_ingestion_worker
 
 
 if __name__ == '__main__':
+    task_runner.recover()
+    start_ingestion_worker()
     app.run(debug=DEBUG, port=5000)
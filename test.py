@@ -1,12 +1,48 @@
+import os
+import sys
+import json
+import time
+import asyncio
 import unittest
+import tempfile
+import threading
 import warnings
+import subprocess
+from pathlib import Path
+from datetime import datetime, timedelta
+from unittest import mock
+from concurrent.futures.process import BrokenProcessPool
 
+import httpx
+import spacy
+from werkzeug.security import generate_password_hash
 from flask import url_for
 from flask_testing import TestCase
 from flask_jwt_extended import create_access_token
 
 from web import app, db
-from web.models import User
+from web.models import User, Job, JobTerm, JobCache, MatchingTask
+from web.ingest import index_jobs, match_indexed_jobs, prune_jobs, start_ingestion_worker, acquire_ingestion_lock
+from web.metrics import Counter, Histogram, startup_duration, fetch_failures
+from web.cache import (job_cache, search_cache, identity_cache, normalize_link, SearchResultsCache, MemoryBackend,
+                       RedisBackend)
+from web.fetcher import Fetcher, fetcher
+from web.pipeline import search_jobs, get_search_results, limit_descriptions, extract_requirements
+from web.deadline import Deadline
+from web.parser import (get_detail_responses, send_detail_request, parse_search_html, parse_detail_html,
+                        PARSER_BACKENDS)
+from web import utils
+from web.utils import extract_jobs_requirements, calculate_matching_score
+from web.matching import JobIndex, calculate_matching_scores, calculate_records_scores
+from web.matcher import CriteriaMatcher, compile_matcher
+from web.records import JobRecord, TermVocabulary, truncate_description
+from web.ranking import TopKSelector
+from web.workers import NLPWorkerPool, PoolSaturatedError
+from web.tasks import task_runner
+from web.asgi import ASGIApplication
+
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures' / 'linkedin'
 
 
 class TestAuth(TestCase):
@@ -21,6 +57,7 @@ class TestAuth(TestCase):
 
     def setUp(self):
         db.create_all()
+        identity_cache.memory.clear()
         self. data = {'email': 'test1@example.com', 'password': 'password', 'username': 'username1'}
 
     def tearDown(self):
@@ -91,6 +128,57 @@ class TestAuth(TestCase):
         # Assert the user is deleted from the database
         deleted_user = db.session.get(User, user.id)
         self.assertIsNone(deleted_user)
+        # Assert that the token of the deleted user is rejected
+        response = self.client.delete(delete_url, headers={'Authorization': 'Bearer ' + token})
+        self.assert401(response)
+
+    def test_password_hashing(self):
+        data = dict(self.data, confirm_password=self.data['password'])
+        self.client.post(url_for('signup'), data=data)
+        user = User.query.filter_by(email=data['email']).first()
+        # Assert that only the hash of the password is saved
+        self.assertTrue(user.password.startswith('pbkdf2:sha256:'))
+        self.assertTrue(user.check_password('password'))
+        self.assertFalse(user.check_password('wrong_password'))
+        # Assert that a second account can not use the same email
+        response = self.client.post(url_for('signup'), data=dict(data, username='username2', password='password2',
+                                                                 confirm_password='password2'))
+        self.assertStatus(response, 409)
+
+    def test_rehash_password(self):
+        # Save a password in plain text, as before the passwords were hashed
+        user = User(email=self.data['email'], password='password', username='username1')
+        db.session.add(user)
+        db.session.commit()
+        response = self.client.post(url_for('login'), data={'email': self.data['email'], 'password': 'password'})
+        self.assert200(response)
+        # Assert that the password is hashed on login
+        db.session.refresh(user)
+        self.assertTrue(user.password.startswith('pbkdf2:sha256:'))
+        self.assertTrue(user.check_password('password'))
+
+    def test_hash_not_accepted_as_password(self):
+        # Save the hash of another method, e.g. copied from a leaked database
+        password_hash = generate_password_hash('password', method='pbkdf2:sha1:1000')
+        user = User(email=self.data['email'], password=password_hash, username='username1')
+        db.session.add(user)
+        db.session.commit()
+        # Assert that the hash is verified as a hash, not compared as a plain text password
+        response = self.client.post(url_for('login'), data={'email': self.data['email'], 'password': password_hash})
+        self.assert401(response)
+        self.assertTrue(user.check_password('password'))
+
+    def test_identity_cache(self):
+        user = User.create_user(**self.data)
+        db.session.add(user)
+        db.session.commit()
+        self.assertEqual(identity_cache.get(user.id).email, self.data['email'])
+        # Assert that the identity is answered from the cache until it is invalidated
+        User.query.filter_by(id=user.id).delete()
+        db.session.commit()
+        self.assertEqual(identity_cache.get(user.id).id, user.id)
+        identity_cache.invalidate(user.id)
+        self.assertIsNone(identity_cache.get(user.id))
 
 
 class TestJobMatching(TestCase):
@@ -149,5 +237,976 @@ class TestJobMatching(TestCase):
         self.assertIsInstance(response.json['job_listings'], list)
 
 
+class RecordedLinkedInTestCase(TestCase):
+    """Serves the recorded LinkedIn pages instead of sending requests to LinkedIn"""
+
+    def create_app(self):
+        warnings.simplefilter('ignore', category=DeprecationWarning)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test.db'
+        app.config['SECRET_KEY'] = 'secret'
+        app.config['TESTING'] = True
+        return app
+
+    def setUp(self):
+        db.create_all()
+        job_cache.memory.clear()
+        search_cache.clear()
+        user = User.create_user(email='test@example.com', password='password', username='username')
+        db.session.add(user)
+        db.session.commit()
+        self.access_token = create_access_token(identity=user.id)
+        self.data = {'location': 'United States', 'keywords': 'Python', 'education': "Bachelor's Degree",
+                     'skills': 'Python,SQL,Data Analysis', 'start': 25}
+        fetcher.transport = httpx.MockTransport(self.handler)
+
+    def tearDown(self):
+        fetcher.transport = None
+        job_cache.memory.clear()
+        db.session.remove()
+        db.drop_all()
+
+    @staticmethod
+    def handler(request):
+        file_name = 'search.html' if 'seeMoreJobPostings' in request.url.path else 'detail.html'
+        return httpx.Response(200, text=(FIXTURES_DIR / file_name).read_text(encoding='utf-8'))
+
+    def get_auth_headers(self):
+        return {'Authorization': 'Bearer ' + self.access_token}
+
+
+class TestJobMatchingStream(RecordedLinkedInTestCase):
+
+    def test_stream(self):
+        response = self.client.get(url_for('job_matching_stream'), data=self.data, headers=self.get_auth_headers())
+        self.assert200(response)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        frames = [json.loads(line) for line in response.data.decode().splitlines()]
+        # Assert that a frame is sent per matched job, then the summary ranks all of them
+        job_frames, summary = frames[:-1], frames[-1]
+        self.assertTrue(all(frame['event'] == 'job' for frame in job_frames))
+        self.assertEqual(summary['event'], 'summary')
+        self.assertEqual(summary['count'], len(job_frames))
+        self.assertEqual(sorted(summary['ranking']), [frame['id'] for frame in job_frames])
+
+
+class TestBrokenNLPPool(RecordedLinkedInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        broken = BrokenProcessPool('A child process terminated abruptly')
+        patcher = mock.patch('web.pipeline.nlp_pool.extract_jobs_requirements', side_effect=broken)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_job_matching(self):
+        response = self.client.get(url_for('job_matching'), data=self.data, headers=self.get_auth_headers())
+        # Assert that the crashed pool is answered like a saturated one
+        self.assertStatus(response, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
+    def test_bulk(self):
+        data = {'location': 'United States', 'keywords': 'Python', 'start': 25, 'profiles-0-skills': 'SQL',
+                'profiles-0-education': 'Master'}
+        response = self.client.post(url_for('bulk_job_matching'), data=data, headers=self.get_auth_headers())
+        self.assertStatus(response, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
+    def test_stream(self):
+        response = self.client.get(url_for('job_matching_stream'), data=self.data, headers=self.get_auth_headers())
+        frames = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(frames, [{'event': 'error', 'message': 'The NLP worker pool restarted, try again later'}])
+
+
+class TestBulkJobMatching(RecordedLinkedInTestCase):
+
+    def test_bulk(self):
+        profiles = [{'skills': 'Python,SQL,Data Analysis', 'education': "Bachelor's Degree"},
+                    {'skills': 'SQL', 'education': 'Master'}]
+        data = {'location': 'United States', 'keywords': 'Python', 'start': 25, 'description': 'none'}
+        for index, profile in enumerate(profiles):
+            data.update({f'profiles-{index}-{name}': value for name, value in profile.items()})
+        with mock.patch('web.pipeline.search_jobs', wraps=search_jobs) as search:
+            response = self.client.post(url_for('bulk_job_matching'), data=data, headers=self.get_auth_headers())
+        self.assert200(response)
+        # Assert that the jobs are searched once & each profile gets the listings of a single job matching request
+        search.assert_called_once()
+        self.assertEqual(len(response.json['profiles']), 2)
+        self.assertTrue(response.json['profiles'][0]['job_listings'])
+        for profile, profile_response in zip(profiles, response.json['profiles']):
+            search_cache.clear()
+            single_data = dict(self.data, description='none', **profile)
+            expected = self.client.get(url_for('job_matching'), data=single_data, headers=self.get_auth_headers())
+            self.assertEqual(profile_response['job_listings'], expected.json['job_listings'])
+
+    def test_missing_profiles(self):
+        data = {'location': 'United States', 'keywords': 'Python'}
+        response = self.client.post(url_for('bulk_job_matching'), data=data, headers=self.get_auth_headers())
+        self.assert400(response)
+
+
+class TestDeadline(RecordedLinkedInTestCase):
+
+    def test_stage_timeout(self):
+        deadline = Deadline(10, {'search': 1.0, 'detail': 2.0, 'nlp': 1.0})
+        # Assert that each stage gets its share of the remaining time & the last stage all of it
+        self.assertAlmostEqual(deadline.stage_timeout('search'), 2.5, places=2)
+        self.assertAlmostEqual(deadline.stage_timeout('detail'), 10 * 2 / 3, places=2)
+        self.assertAlmostEqual(deadline.stage_timeout('nlp'), 10, places=2)
+        self.assertIsNone(Deadline().stage_timeout('search'))
+        # Assert that a stage running out of time is recorded once
+        deadline.expire('nlp')
+        deadline.expire('nlp')
+        self.assertEqual(deadline.expired_stages, ['nlp'])
+
+    def test_partial_results(self):
+        detail_requests = []
+
+        async def handler(request):
+            if 'seeMoreJobPostings' not in request.url.path:
+                detail_requests.append(request.url)
+                # The first job page never answers in time
+                if len(detail_requests) == 1:
+                    await asyncio.sleep(5)
+            return self.handler(request)
+
+        fetcher.transport = httpx.MockTransport(handler)
+        with mock.patch.dict(app.config, REQUEST_DEADLINE=0.5):
+            response = self.client.get(url_for('job_matching'), data=self.data, headers=self.get_auth_headers())
+        self.assert200(response)
+        # Assert that the jobs fetched in time are scored & the response is marked as partial
+        self.assertTrue(response.json['partial'])
+        self.assertEqual(response.json['count'], 2)
+        # Assert that the skipped job is not cached, so it is fetched by the next request
+        response = self.client.get(url_for('job_matching'), data=self.data, headers=self.get_auth_headers())
+        self.assertFalse(response.json['partial'])
+        self.assertEqual(response.json['count'], 3)
+
+    def test_long_descriptions(self):
+        jobs = [{'description': 'Python ' * 10}, {'description': 'SQL'}]
+        with mock.patch.dict(app.config, NLP_MAX_DESCRIPTION_LENGTH=20):
+            analyzed_jobs, descriptions = limit_descriptions(jobs)
+            # Assert that the long description is truncated before the analysis
+            self.assertEqual(descriptions, ['Python Python Python', 'SQL'])
+            app.config['NLP_LONG_DESCRIPTIONS'] = 'skip'
+            analyzed_jobs, descriptions = limit_descriptions(jobs)
+        # Assert that the long description is skipped & its job left without requirements
+        self.assertEqual((analyzed_jobs, descriptions), ([jobs[1]], ['SQL']))
+        self.assertEqual(jobs[0]['requirements'], [])
+
+
+class TestPhraseMatching(RecordedLinkedInTestCase):
+
+    def test_criteria_matcher(self):
+        employee_criteria = {'skills': ['Python', 'Data%20Analysis', 'Go', 'python'], 'education': "Bachelor%27s Degree"}
+        matcher = CriteriaMatcher(employee_criteria, language=spacy.blank('en'))
+        scores = matcher.score([
+            'We need DATA ANALYSIS skills and a bachelor\'s degree, Python is a plus.',
+            'Pythonic code & data analysts are welcome.',
+            'Go, Python & data analysis experience.',
+        ])
+        # Assert that the URL-decoded criteria match the lowercase tokens, but not parts of other words
+        self.assertEqual(scores, [2 / 3 + 1, 0.0, 1.0])
+
+    def test_phrase_mode(self):
+        app.config['MATCHING_MODE'] = 'phrase'
+        try:
+            with mock.patch('web.pipeline.nlp_pool.extract_jobs_requirements') as extract_jobs_requirements:
+                response = self.client.get(url_for('job_matching'), data=self.data, headers=self.get_auth_headers())
+        finally:
+            app.config['MATCHING_MODE'] = 'exact'
+        self.assert200(response)
+        # Assert that the descriptions are matched without extracting their requirements
+        extract_jobs_requirements.assert_not_called()
+        scores = [job['score'] for job in response.json['job_listings']]
+        self.assertTrue(scores)
+        # Assert that the skills & education are found across the paragraphs & list items of the description
+        self.assertTrue(all(score == 2.0 for score in scores))
+
+    def test_phrase_stream(self):
+        compile_matcher.cache_clear()
+        # Match in threads, so the compiled matchers are counted by this process
+        with mock.patch.dict(app.config, MATCHING_MODE='phrase'), \
+                mock.patch('web.pipeline.nlp_pool', NLPWorkerPool(max_workers=0)):
+            response = self.client.get(url_for('job_matching_stream'), data=self.data, headers=self.get_auth_headers())
+            frames = [json.loads(line) for line in response.data.decode().splitlines()]
+        # Assert that the streamed jobs are scored by a single matcher compiled for the request
+        self.assertEqual([frame['job']['score'] for frame in frames[:-1]], [2.0] * 3)
+        self.assertEqual(compile_matcher.cache_info().misses, 1)
+
+
+class TestTopK(RecordedLinkedInTestCase):
+
+    def test_top_k(self):
+        response = self.client.get(url_for('job_matching'), data=self.data, headers=self.get_auth_headers())
+        scores = [job['score'] for job in response.json['job_listings']]
+        # Assert that the listings are sorted from the best match
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        response = self.client.get(url_for('job_matching'), data=dict(self.data, top_k=2),
+                                   headers=self.get_auth_headers())
+        self.assert200(response)
+        self.assertEqual([job['score'] for job in response.json['job_listings']], scores[:2])
+        response = self.client.get(url_for('job_matching'), data=dict(self.data, min_score=scores[0] + 1),
+                                   headers=self.get_auth_headers())
+        self.assertEqual(response.json['job_listings'], [])
+
+
+class TestJobListings(RecordedLinkedInTestCase):
+
+    def test_listings_options(self):
+        data = dict(self.data, description='truncate', description_length=20, per_page=2, page=1)
+        response = self.client.get(url_for('job_matching'), data=data, headers=self.get_auth_headers())
+        self.assert200(response)
+        # Assert that the first page is returned with truncated descriptions
+        self.assertEqual(response.json['count'], 3)
+        self.assertEqual((response.json['page'], response.json['per_page']), (1, 2))
+        self.assertEqual(len(response.json['job_listings']), 2)
+        self.assertTrue(all(len(job['description']) <= 23 for job in response.json['job_listings']))
+        # Assert that the descriptions can be dropped
+        data = dict(self.data, description='none', per_page=2, page=2)
+        response = self.client.get(url_for('job_matching'), data=data, headers=self.get_auth_headers())
+        self.assertEqual(len(response.json['job_listings']), 1)
+        self.assertNotIn('description', response.json['job_listings'][0])
+
+
+class TestMatchingTasks(RecordedLinkedInTestCase):
+
+    def test_task(self):
+        response = self.client.post(url_for('create_matching_task'), data=dict(self.data, limit=10),
+                                    headers=self.get_auth_headers())
+        self.assertStatus(response, 202)
+        task_id = response.json['id']
+        self.assertEqual(response.headers['Location'], url_for('matching_task', task_id=task_id))
+        task_runner.futures[task_id].result(timeout=30)
+
+        response = self.client.get(url_for('matching_task', task_id=task_id), headers=self.get_auth_headers())
+        self.assert200(response)
+        # Assert that the task persisted its results & ranking
+        self.assertEqual(response.json['status'], 'succeeded')
+        self.assertEqual(response.json['progress'], response.json['total'])
+        self.assertTrue(response.json['job_listings'])
+        self.assertEqual(sorted(response.json['ranking']), list(range(len(response.json['job_listings']))))
+        # Assert that a finished task can not be cancelled
+        response = self.client.delete(url_for('cancel_matching_task', task_id=task_id), headers=self.get_auth_headers())
+        self.assertStatus(response, 409)
+
+    def test_cancel_task(self):
+        task = MatchingTask(user_id=1, params={})
+        db.session.add(task)
+        db.session.commit()
+        response = self.client.delete(url_for('cancel_matching_task', task_id=task.id),
+                                      headers=self.get_auth_headers())
+        self.assert200(response)
+        self.assertEqual(response.json['status'], 'cancelled')
+        # Assert that the cancelled task is not run
+        task_runner.run(task.id)
+        self.assertEqual(db.session.get(MatchingTask, task.id).status, 'cancelled')
+
+    def create_task(self) -> MatchingTask:
+        params = {'keywords': 'Python', 'location': 'United%20States', 'start': 25, 'limit': 10, 'top_k': None,
+                  'min_score': None,
+                  'employee_criteria': {'skills': ['Python', 'SQL'], 'education': "Bachelor's Degree"}}
+        task = MatchingTask(user_id=1, params=params)
+        db.session.add(task)
+        db.session.commit()
+        return task
+
+    def test_saturated_pool(self):
+        detail_requests, attempts = [], []
+
+        def handler(request):
+            if 'seeMoreJobPostings' not in request.url.path:
+                detail_requests.append(request.url)
+            return self.handler(request)
+
+        async def extract(jobs, deadline=None):
+            attempts.append(len(jobs))
+            if len(attempts) < 3:
+                raise PoolSaturatedError('The NLP worker pool is saturated, try again later')
+            return await extract_requirements(jobs, deadline)
+
+        fetcher.transport = httpx.MockTransport(handler)
+        task = self.create_task()
+        with mock.patch('web.tasks.extract_requirements', side_effect=extract), \
+                mock.patch('web.tasks.MAX_RETRY_DELAY', 0):
+            task_runner.run(task.id)
+        # Assert that only the analysis is retried, the details are fetched once
+        db.session.refresh(task)
+        self.assertEqual(task.status, 'succeeded')
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(len(detail_requests), 3)
+
+    def test_saturated_pool_retries(self):
+        task = self.create_task()
+        saturated = PoolSaturatedError('The NLP worker pool is saturated, try again later')
+        with mock.patch('web.tasks.extract_requirements', side_effect=saturated) as extract, \
+                mock.patch('web.tasks.MAX_RETRY_DELAY', 0), mock.patch.object(task_runner, 'max_retries', 2):
+            task_runner.run(task.id)
+            # Assert that the task fails once the retries are exhausted
+            self.assertEqual(extract.call_count, 3)
+            db.session.refresh(task)
+            self.assertEqual(task.status, 'failed')
+
+            task = self.create_task()
+
+            async def cancel(delay):
+                MatchingTask.query.filter_by(id=task.id).update({'status': MatchingTask.CANCELLED})
+                db.session.commit()
+
+            with mock.patch('web.tasks.asyncio.sleep', side_effect=cancel):
+                task_runner.run(task.id)
+        # Assert that the task cancelled while waiting for the pool stops
+        db.session.refresh(task)
+        self.assertEqual(task.status, 'cancelled')
+        self.assertEqual(extract.call_count, 4)
+
+    def test_recover(self):
+        stale_task, task = self.create_task(), self.create_task()
+        stale_task.status = MatchingTask.RUNNING
+        stale_task.updated_at = datetime.utcnow() - timedelta(seconds=task_runner.stale_after + 1)
+        db.session.commit()
+        # Assert that only the task left without updates is marked as failed
+        self.assertEqual(task_runner.recover(), 1)
+        db.session.expire_all()
+        self.assertEqual((stale_task.status, task.status), ('failed', 'pending'))
+
+    def test_other_user_task(self):
+        task = MatchingTask(user_id=2, params={})
+        db.session.add(task)
+        db.session.commit()
+        response = self.client.get(url_for('matching_task', task_id=task.id), headers=self.get_auth_headers())
+        self.assert404(response)
+
+
+class TestJobIndex(TestCase):
+
+    def create_app(self):
+        warnings.simplefilter('ignore', category=DeprecationWarning)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test.db'
+        app.config['SECRET_KEY'] = 'secret'
+        app.config['TESTING'] = True
+        return app
+
+    def setUp(self):
+        db.create_all()
+        self.employee_criteria = {'skills': ['Python', 'SQL'], 'education': "Bachelor's Degree"}
+        self.jobs = [
+            {'link': 'https://www.linkedin.com/jobs/view/1?refId=a', 'title': 'Python Developer', 'company': 'Acme',
+             'description': 'Python & SQL', 'requirements': ['Python', 'SQL', "Bachelor's Degree", 'Python']},
+            {'link': 'https://www.linkedin.com/jobs/view/2', 'title': 'Data Analyst', 'company': 'Globex',
+             'description': 'SQL', 'requirements': ['SQL', 'Excel']},
+            {'link': 'https://www.linkedin.com/jobs/view/3', 'title': 'Designer', 'company': 'Initech',
+             'description': 'Figma', 'requirements': ['Figma']},
+        ]
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_match(self):
+        index_jobs(self.jobs)
+        job_list = match_indexed_jobs(self.employee_criteria)
+        # Assert that the scores follow the live matching rules, ignoring the jobs without any match
+        scores = {job['title']: job['score'] for job in job_list}
+        self.assertEqual(scores, {'Python Developer': 2.0, 'Data Analyst': 0.5})
+
+    def test_reindex(self):
+        index_jobs(self.jobs)
+        # Index the same posting found with other tracking parameters & changed requirements
+        job = dict(self.jobs[0], link='https://www.linkedin.com/jobs/view/1?refId=b', requirements=['Python'])
+        index_jobs([job])
+        # Assert that the posting is replaced instead of being duplicated
+        self.assertEqual(Job.query.count(), 3)
+        scores = {job['title']: job['score'] for job in match_indexed_jobs(self.employee_criteria)}
+        self.assertEqual(scores['Python Developer'], 0.5)
+
+    def test_prune(self):
+        index_jobs(self.jobs)
+        # Assert that nothing is removed while the jobs are fresh, then everything once expired
+        self.assertEqual(prune_jobs(max_age=3600), 0)
+        self.assertEqual(prune_jobs(max_age=-1), 3)
+        self.assertEqual(JobTerm.query.count(), 0)
+
+    def test_index_source(self):
+        index_jobs(self.jobs)
+        user = User.create_user(email='test@example.com', password='password', username='username')
+        db.session.add(user)
+        db.session.commit()
+        data = {'location': 'United States', 'keywords': 'Python', 'education': "Bachelor's Degree",
+                'skills': 'Python,SQL', 'source': 'index'}
+        response = self.client.get(url_for('job_matching'), data=data,
+                                   headers={'Authorization': 'Bearer ' + create_access_token(identity=user.id)})
+        # Assert that the jobs are answered from the index
+        self.assert200(response)
+        self.assertEqual([job['title'] for job in response.json['job_listings']], ['Python Developer', 'Data Analyst'])
+
+    def test_ingestion_lock(self):
+        queries = json.dumps([{'keywords': 'Python', 'location': 'United States', 'limit': 25}])
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.dict(app.config, INGEST_QUERIES=queries, INGEST_INTERVAL=3600,
+                                INGEST_LOCK_FILE=str(Path(directory) / 'ingest.lock')), \
+                mock.patch('web.ingest.run_ingestion'):
+            worker = start_ingestion_worker()
+            # Assert that the other workers of the server do not start the ingestion while it runs
+            self.assertIsNone(start_ingestion_worker())
+            worker.stop()
+            worker.join()
+            # Assert that the lock is released once the ingestion stops
+            lock_file = acquire_ingestion_lock()
+            self.assertIsNotNone(lock_file)
+            lock_file.close()
+
+
+class TestMetrics(RecordedLinkedInTestCase):
+
+    def test_metrics_format(self):
+        counter = Counter('test_total', 'Test counter.', ('kind',))
+        counter.inc(kind='a"b')
+        histogram = Histogram('test_seconds', 'Test histogram.', buckets=(0.1, 1))
+        histogram.observe(0.5)
+        # Assert that the metrics follow the Prometheus text format
+        self.assertEqual(counter.render(), '# HELP test_total Test counter.\n# TYPE test_total counter\n'
+                                           'test_total{kind="a\\"b"} 1')
+        self.assertIn('test_seconds_bucket{le="0.1"} 0\ntest_seconds_bucket{le="1"} 1\n'
+                      'test_seconds_bucket{le="+Inf"} 1\ntest_seconds_sum 0.5\ntest_seconds_count 1',
+                      histogram.render())
+
+    def test_stages(self):
+        app.config['SERVER_TIMING'] = True
+        try:
+            response = self.client.get(url_for('job_matching'), data=self.data, headers=self.get_auth_headers())
+        finally:
+            app.config['SERVER_TIMING'] = False
+        self.assert200(response)
+        # Assert that the duration of the stages is sent back to the client
+        stages = [timing.split(';')[0] for timing in response.headers['Server-Timing'].split(', ')]
+        for stage in ('search', 'parse_search', 'detail', 'parse_detail', 'nlp', 'score', 'total'):
+            self.assertIn(stage, stages)
+        # Assert that the concurrent detail requests are not added up, the detail stage is their wall-clock time
+        self.assertNotIn('detail_request', stages)
+        timings = dict(timing.split(';dur=') for timing in response.headers['Server-Timing'].split(', '))
+        self.assertLessEqual(float(timings['detail']), float(timings['total']))
+        # Assert that the stages & the duration of each detail request are exposed to Prometheus
+        response = self.client.get(url_for('metrics'))
+        self.assert200(response)
+        self.assertIn(b'job_matching_stage_duration_seconds_count{stage="search"}', response.data)
+        self.assertIn(b'job_matching_detail_request_duration_seconds_count', response.data)
+        self.assertIn(b'process_startup_duration_seconds{phase="app"}', response.data)
+
+
+class TestJobCache(TestCase):
+
+    def create_app(self):
+        warnings.simplefilter('ignore', category=DeprecationWarning)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test.db'
+        app.config['TESTING'] = True
+        return app
+
+    def setUp(self):
+        db.create_all()
+        job_cache.memory.clear()
+        self.job = {
+            'link': 'https://www.linkedin.com/jobs/view/python-developer-at-acme-1?refId=abc&trackingId=xyz',
+            'description': 'Python developer with SQL experience',
+            'requirements': ['Python developer', 'SQL experience'],
+        }
+
+    def tearDown(self):
+        job_cache.memory.clear()
+        db.session.remove()
+        db.drop_all()
+
+    def test_normalize_link(self):
+        # Assert that the tracking parameters are removed from the link
+        self.assertEqual(normalize_link(self.job['link']),
+                         'https://www.linkedin.com/jobs/view/python-developer-at-acme-1')
+
+    def test_load_by_link(self):
+        # Store the job, then forget the in-memory entries to hit the database
+        job_cache.save([self.job])
+        job_cache.memory.clear()
+        # Load the same job found by a different search
+        job = {'link': 'https://www.linkedin.com/jobs/view/python-developer-at-acme-1?refId=other'}
+        missing_jobs = job_cache.load([job])
+        # Assert that the job is found with its description & requirements
+        self.assertEqual(missing_jobs, [])
+        self.assertEqual(job['description'], self.job['description'])
+        self.assertEqual(job['requirements'], self.job['requirements'])
+
+    def test_load_by_description(self):
+        # Store the job, then look up the same description posted under another link
+        job_cache.save([self.job])
+        job = {'link': 'https://www.linkedin.com/jobs/view/python-developer-at-acme-2',
+               'description': self.job['description']}
+        # Assert that the job is missing by link, but its requirements are reused
+        self.assertEqual(job_cache.load([job]), [job])
+        self.assertEqual(job_cache.load_requirements([job]), [])
+        self.assertEqual(job['requirements'], self.job['requirements'])
+
+    def test_save_existing(self):
+        job_cache.save([self.job])
+        job_cache.memory.clear()
+        # Save a changed version of the same posting twice in one batch, as if found by two requests
+        changed_job = dict(self.job, description='Go developer', requirements=['Go developer'])
+        job_cache.save([changed_job, dict(changed_job)])
+        # Assert that the saved posting is updated
+        row = db.session.get(JobCache, normalize_link(self.job['link']))
+        db.session.refresh(row)
+        self.assertEqual((row.description, row.requirements), ('Go developer', ['Go developer']))
+        self.assertEqual(JobCache.query.count(), 1)
+
+    def test_revalidate_expired(self):
+        job_cache.save([dict(self.job, etag='"v1"')])
+        job_cache.memory.clear()
+        JobCache.query.update({'updated_at': datetime.utcnow() - timedelta(seconds=job_cache.ttl + 1)})
+        db.session.commit()
+        descriptions = {'"v1"': None, '"v2"': self.job['description'], '"v3"': 'Go developer'}
+        sent_headers = []
+
+        def handler(request):
+            sent_headers.append(request.headers.get('If-None-Match'))
+            etag = '"v%d"' % len(sent_headers)
+            if descriptions[etag] is None:
+                return httpx.Response(304, headers={'ETag': etag})
+            text = f'<div class="show-more-less-html__markup">{descriptions[etag]}</div>'
+            return httpx.Response(200, text=text, headers={'ETag': etag})
+
+        async def revalidate():
+            job = {'link': self.job['link']}
+            # Assert that the expired job is fetched again with the saved validators
+            self.assertEqual(job_cache.load([job]), [job])
+            async with fetcher.session() as session:
+                await send_detail_request(session, job)
+            job_cache.save([job])
+            job_cache.memory.clear()
+            JobCache.query.update({'updated_at': datetime.utcnow() - timedelta(seconds=job_cache.ttl + 1)})
+            db.session.commit()
+            return job
+
+        fetcher.transport = httpx.MockTransport(handler)
+        try:
+            # Assert that the requirements are kept when the page is not modified or the description is the same
+            job = asyncio.run(revalidate())
+            self.assertEqual((job['description'], job['requirements']), (self.job['description'],
+                                                                         self.job['requirements']))
+            job = asyncio.run(revalidate())
+            self.assertEqual(job['requirements'], self.job['requirements'])
+            # Assert that a changed description needs its requirements to be extracted again
+            job = asyncio.run(revalidate())
+            self.assertEqual(job['description'], 'Go developer')
+            self.assertIsNone(job.get('requirements'))
+        finally:
+            fetcher.transport = None
+        self.assertEqual(sent_headers, ['"v1"', '"v1"', '"v2"'])
+
+
+class TestParser(unittest.TestCase):
+    """Golden file tests, every parser backend has to return the saved output of the recorded LinkedIn pages"""
+
+    def test_parse_search(self):
+        html = (FIXTURES_DIR / 'search.html').read_text(encoding='utf-8')
+        expected_jobs = json.loads((FIXTURES_DIR / 'search.json').read_text(encoding='utf-8'))
+        for backend in PARSER_BACKENDS:
+            with self.subTest(backend=backend):
+                self.assertEqual(parse_search_html(html, backend), expected_jobs)
+
+    def test_parse_detail(self):
+        expected_descriptions = json.loads((FIXTURES_DIR / 'detail.json').read_text(encoding='utf-8'))
+        for file_name, expected_description in expected_descriptions.items():
+            html = (FIXTURES_DIR / file_name).read_text(encoding='utf-8')
+            for backend in PARSER_BACKENDS:
+                with self.subTest(file_name=file_name, backend=backend):
+                    self.assertEqual(parse_detail_html(html, backend), expected_description)
+
+    def test_empty_response(self):
+        for backend in PARSER_BACKENDS:
+            with self.subTest(backend=backend):
+                self.assertEqual(parse_search_html('', backend), [])
+                self.assertIsNone(parse_detail_html('', backend))
+
+
+class TestFetcher(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.calls = {}
+
+    def handler(self, request):
+        # Fail the first call of each link, the broken link always fails
+        path = request.url.path
+        self.calls[path] = self.calls.get(path, 0) + 1
+        if path == '/broken' or self.calls[path] == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, text='<div class="show-more-less-html__markup"> Python </div>')
+
+    def get_fetcher(self, retries):
+        return Fetcher(rate=1000, burst=1000, retries=retries, backoff=0, transport=httpx.MockTransport(self.handler))
+
+    async def test_retry(self):
+        async with self.get_fetcher(retries=1).session() as session:
+            response = await session.get('https://example.com/job')
+        # Assert that the failed request is retried once
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.calls['/job'], 2)
+
+    async def test_failed_detail_request(self):
+        jobs = [{'link': 'https://example.com/job'}, {'link': 'https://example.com/broken'}]
+        async with self.get_fetcher(retries=2).session() as session:
+            jobs = await get_detail_responses(jobs, session)
+        # Assert that the broken page does not fail the other one
+        self.assertEqual(jobs[0]['description'], 'Python')
+        self.assertIsNone(jobs[1]['description'])
+        self.assertEqual(self.calls['/broken'], 3)
+
+
+class TestASGI(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.events = []
+        self.application = ASGIApplication(app, threads=2)
+        self.application.on_startup(lambda: self.events.append('startup'))
+        self.application.on_startup(fetcher.start)
+        self.application.on_shutdown(lambda: self.events.append('shutdown'))
+        self.application.on_shutdown(fetcher.close)
+
+    async def lifespan(self, *events):
+        messages, sent = [{'type': f'lifespan.{event}'} for event in events], []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        await self.application({'type': 'lifespan'}, receive, send)
+        return sent
+
+    async def test_lifespan(self):
+        self.assertEqual(await self.lifespan('startup', 'shutdown'),
+                         ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+        self.assertEqual(self.events, ['startup', 'shutdown'])
+
+    async def test_shared_session(self):
+        await self.application.startup()
+        try:
+            transport = httpx.ASGITransport(app=self.application)
+            async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+                response = await client.get('/metrics')
+            self.assertEqual(response.status_code, 200)
+            # Assert that the requests reuse the session opened on startup
+            async with fetcher.session() as session:
+                self.assertIs(session, fetcher._session)
+        finally:
+            await self.application.shutdown()
+        self.assertIsNone(fetcher._session)
+
+
+class TestSearchJobs(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.search_html = (FIXTURES_DIR / 'search.html').read_text(encoding='utf-8')
+        self.starts = []
+        self.failing_starts = {26}
+
+    def handler(self, request):
+        # Every page returns the same recorded jobs, the second page fails
+        start = int(request.url.params['start'])
+        self.starts.append(start)
+        if start in self.failing_starts:
+            return httpx.Response(503)
+        return httpx.Response(200, text=self.search_html)
+
+    async def search(self, limit):
+        transport = httpx.MockTransport(self.handler)
+        async with Fetcher(rate=1000, burst=1000, retries=0, transport=transport).session() as session:
+            return await search_jobs(session, 'Python', 'United%20States', 1, limit)
+
+    async def test_single_page(self):
+        jobs = await self.search(limit=None)
+        self.assertEqual(self.starts, [1])
+        self.assertEqual(len(jobs), 3)
+
+    async def test_pages(self):
+        failures = fetch_failures.get(kind='search')
+        jobs = await self.search(limit=60)
+        # Assert that the pages are fetched, then the duplicated jobs are removed
+        self.assertEqual(sorted(self.starts), [1, 26, 51])
+        self.assertEqual(len(jobs), 3)
+        # Assert that the failed page is skipped & counted
+        self.assertEqual(fetch_failures.get(kind='search'), failures + 1)
+        # Assert that the number of jobs is capped by the limit
+        self.assertEqual(len(await self.search(limit=2)), 2)
+
+    async def test_all_pages_failed(self):
+        self.failing_starts = {1, 26, 51}
+        failures = fetch_failures.get(kind='search')
+        # Assert that the error is raised only once every page failed
+        with self.assertRaises(httpx.HTTPStatusError):
+            await self.search(limit=60)
+        self.assertEqual(fetch_failures.get(kind='search'), failures + 3)
+
+
+class FakeRedis:
+    """Local stand-in of the used Redis client methods"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode()
+
+    def scan_iter(self, match):
+        return [key for key in self.data if key.startswith(match.rstrip('*'))]
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+class TestSearchResultsCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.calls = 0
+
+    async def search(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return [{'title': 'Python Developer', 'link': 'https://www.linkedin.com/jobs/view/1'}]
+
+    async def failing_search(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        raise httpx.ConnectError('Connection refused')
+
+    async def test_coalescing(self):
+        cache = SearchResultsCache(MemoryBackend(), ttl=60)
+        key = cache.get_key('Python', 'United%20States', 1)
+        results = await asyncio.gather(*(cache.get_or_search(key, self.search) for _ in range(5)))
+        # Assert that the concurrent searches share one search, but not the same jobs
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(jobs == results[0] for jobs in results))
+        self.assertIsNot(results[0][0], results[1][0])
+        # Assert that the normalized search is answered from the cache
+        results[0][0]['description'] = 'Python'
+        jobs = await cache.get_or_search(cache.get_key(' python ', 'united states', 1), self.search)
+        self.assertEqual(self.calls, 1)
+        self.assertNotIn('description', jobs[0])
+
+    async def test_failed_search(self):
+        cache = SearchResultsCache(MemoryBackend(), ttl=60)
+        key = cache.get_key('Python', 'United%20States', 1)
+        results = await asyncio.gather(*(cache.get_or_search(key, self.failing_search) for _ in range(3)),
+                                       return_exceptions=True)
+        # Assert that the error is raised to every waiting search & not cached
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(isinstance(result, httpx.ConnectError) for result in results))
+        self.assertEqual(len(await cache.get_or_search(key, self.search)), 1)
+        self.assertEqual(self.calls, 2)
+
+    async def test_leader_timeout(self):
+        cache = SearchResultsCache(MemoryBackend(), ttl=60)
+        key = cache.get_key('Python', 'United%20States', 1)
+
+        async def slow_search():
+            await asyncio.sleep(0.1)
+            return await self.search()
+
+        leader = asyncio.ensure_future(asyncio.wait_for(cache.get_or_search(key, slow_search), 0.01))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.get_or_search(key, slow_search))
+        # Assert that the leader running out of time does not cancel the search of the follower
+        with self.assertRaises(asyncio.TimeoutError):
+            await leader
+        self.assertEqual(len(await follower), 1)
+        self.assertEqual(self.calls, 1)
+
+    async def test_leader_loop_closed(self):
+        started = threading.Event()
+
+        async def slow_search(*args):
+            started.set()
+            await asyncio.sleep(1)
+            return await self.search()
+
+        search_cache.clear()
+        with mock.patch('web.pipeline.search_jobs', side_effect=slow_search):
+            # The leader runs on its own event loop, closed once the request ran out of time as under WSGI
+            leader = threading.Thread(target=asyncio.run, args=(get_search_results(
+                None, 'Python', 'United%20States', 1, deadline=Deadline(0.6)),))
+            leader.start()
+            started.wait(1)
+            deadline = Deadline(10)
+            jobs = await get_search_results(None, 'Python', 'United%20States', 1, deadline=deadline)
+            leader.join()
+        # Assert that the waiting request answers without the cancelled search, instead of failing
+        self.assertEqual((jobs, deadline.expired_stages), ([], ['search']))
+
+    async def test_throttled_search(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(429)
+
+        search_cache.clear()
+        transport = httpx.MockTransport(handler)
+        async with Fetcher(rate=1000, burst=1000, retries=0, transport=transport).session() as session:
+            for _ in range(2):
+                with self.assertRaises(httpx.HTTPStatusError):
+                    await get_search_results(session, 'Python', 'United%20States', 1)
+        # Assert that the throttled response is not cached as an empty search
+        self.assertEqual(len(requests), 2)
+
+    async def test_redis_backend(self):
+        client = FakeRedis()
+        cache = SearchResultsCache(RedisBackend(client=client, ttl=60), ttl=60)
+        key = cache.get_key('Python', 'United%20States', 1, 25)
+        await cache.get_or_search(key, self.search)
+        jobs = await cache.get_or_search(key, self.search)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(jobs[0]['title'], 'Python Developer')
+        cache.clear()
+        self.assertEqual(client.data, {})
+
+
+class TestNLPWorkerPool(unittest.IsolatedAsyncioTestCase):
+
+    async def test_empty_descriptions(self):
+        # Assert that nothing is submitted for an empty list of descriptions
+        self.assertEqual(await NLPWorkerPool().extract_jobs_requirements([]), [])
+
+    async def test_saturated_pool(self):
+        pool = NLPWorkerPool(max_pending=1)
+        # Fill the only pending slot, then assert that the next task is rejected
+        pool.acquire()
+        with self.assertRaises(PoolSaturatedError):
+            await pool.extract_jobs_requirements(['Python developer'])
+        # Assert that the rejected task does not take a slot
+        pool.release()
+        self.assertEqual(pool.pending, 0)
+
+    async def test_timed_out_task(self):
+        pool = NLPWorkerPool(max_pending=1)
+        with mock.patch('web.workers.utils.extract_jobs_requirements', side_effect=lambda *args, **kwargs:
+                        time.sleep(0.3) or [[]]):
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(pool.extract_jobs_requirements(['Python developer']), 0.05)
+            # Assert that the running extraction keeps its slot until it is over
+            self.assertEqual(pool.pending, 1)
+            with self.assertRaises(PoolSaturatedError):
+                await pool.extract_jobs_requirements(['Python developer'])
+            await asyncio.sleep(0.4)
+        self.assertEqual(pool.pending, 0)
+        pool.shutdown()
+
+    async def test_broken_pool(self):
+        pool = NLPWorkerPool(max_workers=1)
+        # Assert that a worker dying while running a task fails it & the next task runs in a new pool
+        with self.assertRaises(BrokenProcessPool):
+            await pool.run(os._exit, 1)
+        self.assertEqual(await pool.run(abs, -1), 1)
+        # Assert that a pool found broken when submitting a task is replaced too
+        with self.assertRaises(BrokenProcessPool):
+            await asyncio.wrap_future(pool.executor.submit(os._exit, 1))
+        self.assertEqual(await pool.run(abs, -2), 2)
+        self.assertEqual(pool.pending, 0)
+        pool.shutdown()
+
+
+class TestMatching(unittest.TestCase):
+
+    def setUp(self):
+        self.employee_criteria = {'skills': ['Python', 'SQL', 'Data%20Analysis'], 'education': "Bachelor's Degree"}
+        self.jobs_requirements = [
+            ['Google', 'Python', 'SQL', 'Python', "Bachelor's Degree"],
+            ['data analysis', 'python', 'a team'],
+            [],
+            ['SQL'],
+        ]
+
+    def test_exact_mode(self):
+        # Assert that the default mode gives the same scores as the per job calculation
+        expected_scores = [calculate_matching_score(self.employee_criteria, job_requirements)
+                           for job_requirements in self.jobs_requirements]
+        self.assertEqual(calculate_matching_scores(self.employee_criteria, self.jobs_requirements), expected_scores)
+
+    def test_lower_mode(self):
+        index = JobIndex(self.jobs_requirements, mode='lower')
+        # Assert that the terms are matched regardless of their case & URL encoding
+        self.assertEqual(index.score(self.employee_criteria).tolist(), [2 / 3 + 1, 2 / 3, 0, 1 / 3])
+
+    def test_score_many(self):
+        employee_criteria_list = [
+            self.employee_criteria,
+            {'skills': ['SQL', 'Go'], 'education': 'Google'},
+            {'skills': [], 'education': "Bachelor's Degree"},
+            {'skills': ['Rust'], 'education': 'PhD'},
+        ]
+        for mode in ('exact', 'lower'):
+            index = JobIndex(self.jobs_requirements, mode=mode)
+            # Assert that the matrix holds the scores of each criteria calculated alone
+            self.assertEqual(index.score_many(employee_criteria_list).tolist(),
+                             [index.score(employee_criteria).tolist() for employee_criteria in employee_criteria_list])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            JobIndex(self.jobs_requirements, mode='unknown')
+
+    def test_job_records(self):
+        vocabulary = TermVocabulary('lower')
+        jobs = [JobRecord.from_dict({'link': str(i), 'title': 'Title', 'company': 'Company', 'requirements': terms},
+                                    vocabulary) for i, terms in enumerate(self.jobs_requirements)]
+        # Assert that the terms are interned once & the records are scored like their requirements
+        self.assertEqual(len(vocabulary), 6)
+        self.assertEqual(list(jobs[0].term_ids), [0, 1, 2, 1, 3])
+        self.assertEqual(JobIndex.from_records(jobs, vocabulary).score(self.employee_criteria).tolist(),
+                         JobIndex(self.jobs_requirements, mode='lower').score(self.employee_criteria).tolist())
+        # Assert that the records scored one by one get the scores of the index
+        self.assertEqual(calculate_records_scores(self.employee_criteria, jobs, vocabulary),
+                         JobIndex(self.jobs_requirements, mode='lower').score(self.employee_criteria).tolist())
+        self.assertEqual(calculate_records_scores({'skills': [], 'education': 'Google'}, jobs, vocabulary), [0.0] * 4)
+
+    def test_truncate_description(self):
+        self.assertEqual(truncate_description('Python developer wanted', 12), 'Python...')
+        self.assertEqual(truncate_description('Python', 12), 'Python')
+
+    def test_top_k_selector(self):
+        selector = TopKSelector(k=3, min_score=0.5, key=lambda item: item[1])
+        selector.extend([('a', 0.5), ('b', 1.5), ('c', 0.0), ('d', 1.0), ('e', 0.2), ('f', 1.5), ('g', 0.5)])
+        # Assert that the best items are kept in descending order, ties in the order they came
+        self.assertEqual(selector.result(), [('b', 1.5), ('f', 1.5), ('d', 1.0)])
+        self.assertEqual(selector.count, 5)
+        # Assert that all the positive items are kept without a limit
+        selector = TopKSelector(key=lambda item: item[1])
+        selector.extend([('a', 0.5), ('b', 0.0), ('c', 1.0)])
+        self.assertEqual(selector.result(), [('c', 1.0), ('a', 0.5)])
+
+
+class TestJobRequirements(unittest.TestCase):
+
+    def setUp(self):
+        self.descriptions = [
+            'We are looking for a Python developer with SQL experience to join Google.',
+            'Bachelor\'s Degree in Computer Science and strong Data Analysis skills are required.',
+        ]
+
+    def test_batch_extraction(self):
+        # Extract the requirements of all descriptions at once
+        jobs_requirements = extract_jobs_requirements(self.descriptions, batch_size=2)
+        # Assert that disabling the unused pipeline components keeps the requirements of the full pipeline
+        expected = [utils.get_doc_requirements(utils.get_nlp()(description)) for description in self.descriptions]
+        self.assertEqual(jobs_requirements, expected)
+
+    def test_lazy_model_loading(self):
+        # Assert that setting up the application does not load the model
+        code = 'import web.utils; print(web.utils.nlp is None)'
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=Path(__file__).resolve().parent)
+        self.assertEqual(output.strip(), b'True')
+        # Assert that the model is loaded once, on first use
+        self.assertIs(utils.get_nlp(), utils.get_nlp())
+        self.assertGreater(startup_duration.get(phase='nlp_model'), 0)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,5 @@
 import os
+import time
 from pathlib import Path
 
 from flask import Flask
@@ -11,6 +12,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Used to report the time taken to set up the application
+STARTED_AT = time.perf_counter()
 
 BASE_DIR = Path(__file__).resolve().parent
 
@@ -25,6 +28,79 @@ app.config.update({
     'WTF_CSRF_ENABLED': os.environ.get('WTF_CSRF_ENABLED'),
     'JWT_SECRET_KEY': os.environ.get('JWT_SECRET_KEY'),
     'JWT_IDENTITY_CLAIM': 'id',
+    # PBKDF2 iterations of the password hashes, the older hashes are upgraded on login, & the threads computing them
+    'PASSWORD_HASH_ITERATIONS': int(os.environ.get('PASSWORD_HASH_ITERATIONS', 600000)),
+    'PASSWORD_HASH_WORKERS': int(os.environ.get('PASSWORD_HASH_WORKERS', 4)),
+    # Users of the JWT protected requests cache, its size & expiry in seconds (0 looks the user up on each request)
+    'IDENTITY_CACHE_SIZE': int(os.environ.get('IDENTITY_CACHE_SIZE', 1024)),
+    'IDENTITY_CACHE_TTL': int(os.environ.get('IDENTITY_CACHE_TTL', 30)),
+    # Add a `Server-Timing` header with the duration of each stage to the responses
+    'SERVER_TIMING': os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes'),
+    # Spacy batching options used while extracting job requirements
+    'NLP_BATCH_SIZE': int(os.environ.get('NLP_BATCH_SIZE', 32)),
+    'NLP_N_PROCESS': int(os.environ.get('NLP_N_PROCESS', 1)),
+    # Spacy model, loaded on the first extraction unless preloaded on startup, e.g. before forking the workers
+    'NLP_MODEL': os.environ.get('NLP_MODEL', 'en_core_web_sm'),
+    'NLP_PRELOAD': os.environ.get('NLP_PRELOAD', '').lower() in ('1', 'true', 'yes'),
+    # Worker processes running spaCy, one per CPU by default (0 runs it in threads instead) & the maximum pending
+    # extraction tasks
+    'NLP_WORKERS': int(os.environ.get('NLP_WORKERS', os.cpu_count() or 1)),
+    'NLP_QUEUE_SIZE': int(os.environ.get('NLP_QUEUE_SIZE', 64)),
+    # Descriptions longer than this number of characters are truncated, or skipped, before extracting requirements
+    'NLP_MAX_DESCRIPTION_LENGTH': int(os.environ.get('NLP_MAX_DESCRIPTION_LENGTH', 20000)),
+    'NLP_LONG_DESCRIPTIONS': os.environ.get('NLP_LONG_DESCRIPTIONS', 'truncate'),
+    # Matching terms normalization, `exact` compares the raw terms & `lower` the URL-decoded lowercase ones,
+    # `phrase` skips the requirements extraction & looks the criteria up in the descriptions with a phrase matcher
+    'MATCHING_MODE': os.environ.get('MATCHING_MODE', 'exact'),
+    # Tokens attribute compared by the phrase matcher, `LOWER` or `LEMMA`
+    'PHRASE_MATCHER_ATTR': os.environ.get('PHRASE_MATCHER_ATTR', 'LOWER').upper(),
+    # Extracted job requirements cache, size of the in-memory front & expiry in seconds
+    'JOB_CACHE_SIZE': int(os.environ.get('JOB_CACHE_SIZE', 1024)),
+    'JOB_CACHE_TTL': int(os.environ.get('JOB_CACHE_TTL', 86400)),
+    # LinkedIn address, can point to a stand-in server for benchmarks
+    'LINKEDIN_BASE_URL': os.environ.get('LINKEDIN_BASE_URL', 'https://www.linkedin.com'),
+    # Jobs per LinkedIn search page & maximum pages fetched for one request
+    'SEARCH_PAGE_SIZE': int(os.environ.get('SEARCH_PAGE_SIZE', 25)),
+    'SEARCH_MAX_PAGES': int(os.environ.get('SEARCH_MAX_PAGES', 10)),
+    # Parsed search results cache, `memory` (per process) or `redis` backend, its size & expiry in seconds
+    'SEARCH_CACHE_BACKEND': os.environ.get('SEARCH_CACHE_BACKEND', 'memory'),
+    'SEARCH_CACHE_URL': os.environ.get('SEARCH_CACHE_URL', 'redis://localhost:6379/0'),
+    'SEARCH_CACHE_SIZE': int(os.environ.get('SEARCH_CACHE_SIZE', 256)),
+    'SEARCH_CACHE_TTL': int(os.environ.get('SEARCH_CACHE_TTL', 300)),
+    # Background ingestion of the job index, JSON list of {"keywords", "location", "limit"} searches, the interval
+    # between two runs in seconds (0 disables the background worker) & the age after which unseen jobs are removed
+    'INGEST_QUERIES': os.environ.get('INGEST_QUERIES', '[]'),
+    'INGEST_INTERVAL': int(os.environ.get('INGEST_INTERVAL', 0)),
+    'JOB_INDEX_TTL': int(os.environ.get('JOB_INDEX_TTL', 7 * 86400)),
+    # File locked by the process running the background ingestion, so a single worker of the server runs it
+    'INGEST_LOCK_FILE': os.environ.get('INGEST_LOCK_FILE', str(BASE_DIR.parent / 'ingest.lock')),
+    # HTML parser backend used for LinkedIn pages, either `html.parser` (BeautifulSoup) or `lxml`
+    'PARSER_BACKEND': os.environ.get('PARSER_BACKEND', 'lxml'),
+    # Shared HTTP fetcher options, the rate is the number of requests per second sent to each host
+    'FETCH_CONCURRENCY': int(os.environ.get('FETCH_CONCURRENCY', 10)),
+    'FETCH_MAX_CONNECTIONS': int(os.environ.get('FETCH_MAX_CONNECTIONS', 20)),
+    'FETCH_RATE': float(os.environ.get('FETCH_RATE', 5)),
+    'FETCH_BURST': int(os.environ.get('FETCH_BURST', 10)),
+    'FETCH_TIMEOUT': float(os.environ.get('FETCH_TIMEOUT', 10)),
+    'FETCH_RETRIES': int(os.environ.get('FETCH_RETRIES', 3)),
+    'FETCH_BACKOFF': float(os.environ.get('FETCH_BACKOFF', 0.5)),
+    # Seconds a job matching request may take (0 disables the deadline), split across the search, detail & NLP
+    # stages by their shares, the request answers the jobs scored so far as partial results once it runs out
+    'REQUEST_DEADLINE': float(os.environ.get('REQUEST_DEADLINE', 30)),
+    'SEARCH_DEADLINE_SHARE': float(os.environ.get('SEARCH_DEADLINE_SHARE', 0.2)),
+    'DETAIL_DEADLINE_SHARE': float(os.environ.get('DETAIL_DEADLINE_SHARE', 0.5)),
+    'NLP_DEADLINE_SHARE': float(os.environ.get('NLP_DEADLINE_SHARE', 0.3)),
+    # Maximum employee criteria scored by one bulk job matching request
+    'BULK_MAX_PROFILES': int(os.environ.get('BULK_MAX_PROFILES', 500)),
+    # Threads running the background job matching tasks & the maximum waiting or running tasks
+    'TASK_WORKERS': int(os.environ.get('TASK_WORKERS', 2)),
+    'TASK_QUEUE_SIZE': int(os.environ.get('TASK_QUEUE_SIZE', 32)),
+    # Attempts of a task to analyze its jobs while the NLP worker pool is saturated & the seconds after which a task
+    # left pending or running without any update, e.g. by a crashed process, is marked as failed on startup
+    'TASK_MAX_RETRIES': int(os.environ.get('TASK_MAX_RETRIES', 5)),
+    'TASK_STALE_AFTER': int(os.environ.get('TASK_STALE_AFTER', 600)),
+    # Threads running the Flask requests when served through ASGI, i.e. the maximum in-flight requests
+    'ASGI_THREADS': int(os.environ.get('ASGI_THREADS', 40)),
 })
 
 
@@ -36,3 +112,9 @@ db = SQLAlchemy(app)
 
 
 from web import routs
+from web.utils import preload_nlp
+from web.metrics import startup_duration
+
+if app.config['NLP_PRELOAD']:
+    preload_nlp()
+startup_duration.set(time.perf_counter() - STARTED_AT, phase='app')
@@ -0,0 +1,169 @@
+"""
+ASGI entry point, serving the Flask application with an event loop living as long as the server:
+
+    uvicorn web.asgi:application --workers 4
+
+The async views run on the server loop instead of a new loop per request, so the shared resources opened by the
+startup hooks - e.g. the pooled HTTP client of the fetcher - are reused by every request of the worker.
+"""
+import inspect
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+
+from web import app
+from web.fetcher import fetcher
+from web.workers import nlp_pool
+from web.tasks import task_runner
+from web.security import password_hasher
+from web.ingest import start_ingestion_worker
+
+
+logger = logging.getLogger(__name__)
+
+
+class FlaskInstance(WsgiToAsgiInstance):
+    """
+    Runs one request of the WSGI application in the given thread pool. The default adapter runs all the requests
+    in a single thread, one request at a time.
+    """
+
+    def __init__(self, wsgi_application, executor: ThreadPoolExecutor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        # The response is sent from the pool thread, so `start_response` is called in the thread running the app
+        await sync_to_async(self.serve, thread_sensitive=False, executor=self.executor)(body)
+
+    def serve(self, body):
+        """
+        Run the WSGI application on the request & send its response, the same way as the default adapter.
+        """
+        environ = self.build_environ(self.scope, body)
+        bytes_sent = 0
+        for output in self.wsgi_application(environ, self.start_response):
+            if not self.response_started:
+                self.response_started = True
+                self.sync_send(self.response_start)
+            # Do not send more bytes than the Content-Length header allows
+            if self.response_content_length is not None:
+                output = output[:self.response_content_length - bytes_sent]
+            self.sync_send({'type': 'http.response.body', 'body': output, 'more_body': True})
+            bytes_sent += len(output)
+            if bytes_sent == self.response_content_length:
+                break
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({'type': 'http.response.body'})
+
+
+class ASGIApplication:
+    """
+    ASGI application wrapping a Flask application, handling the lifespan events with startup & shutdown hooks.
+    Hooks are called without arguments, in the registration order on startup & the reverse order on shutdown.
+    """
+
+    def __init__(self, wsgi_application, threads: int = 40):
+        self.wsgi_application = wsgi_application
+        self.threads = threads
+        self.executor = None
+        self.startup_hooks = []
+        self.shutdown_hooks = []
+
+    def on_startup(self, func):
+        self.startup_hooks.append(func)
+        return func
+
+    def on_shutdown(self, func):
+        self.shutdown_hooks.insert(0, func)
+        return func
+
+    @staticmethod
+    async def run_hooks(hooks: list):
+        for hook in hooks:
+            result = hook()
+            if inspect.isawaitable(result):
+                await result
+
+    async def startup(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='asgi')
+        await self.run_hooks(self.startup_hooks)
+
+    async def shutdown(self):
+        try:
+            await self.run_hooks(self.shutdown_hooks)
+        finally:
+            self.executor.shutdown(wait=False)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            event = message['type'].rsplit('.', 1)[-1]
+            try:
+                await (self.startup() if event == 'startup' else self.shutdown())
+            except Exception as exc:
+                logger.exception('ASGI %s failed', event)
+                await send({'type': f'lifespan.{event}.failed', 'message': str(exc)})
+                return
+            await send({'type': f'lifespan.{event}.complete'})
+            if event == 'shutdown':
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if self.executor is None:
+            raise RuntimeError('The ASGI application must be served with the lifespan protocol enabled')
+        await FlaskInstance(self.wsgi_application, self.executor)(scope, receive, send)
+
+
+application = ASGIApplication(app, threads=app.config['ASGI_THREADS'])
+
+ingestion_worker = None
+
+
+@application.on_startup
+async def start_fetcher():
+    await fetcher.start()
+
+
+@application.on_shutdown
+async def close_fetcher():
+    await fetcher.close()
+
+
+@application.on_startup
+def start_ingestion():
+    global ingestion_worker
+    ingestion_worker = start_ingestion_worker()
+
+
+@application.on_shutdown
+def stop_ingestion():
+    if ingestion_worker is not None:
+        ingestion_worker.stop()
+
+
+@application.on_shutdown
+def shutdown_nlp_pool():
+    nlp_pool.shutdown(wait=False)
+
+
+@application.on_startup
+def recover_tasks():
+    task_runner.recover()
+
+
+@application.on_shutdown
+def shutdown_task_runner():
+    task_runner.shutdown(wait=False)
+
+
+@application.on_shutdown
+def shutdown_password_hasher():
+    password_hasher.shutdown(wait=False)
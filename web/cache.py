@@ -0,0 +1,415 @@
+import json
+import time
+import asyncio
+import hashlib
+import threading
+import concurrent.futures
+from typing import NamedTuple
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, urlunsplit, unquote
+
+import httpx
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import sqlite, postgresql
+
+from web import app, db
+from web.models import User, JobCache
+from web.metrics import search_cache_lookups
+
+
+# Dialects saving the cached jobs with an `INSERT ... ON CONFLICT DO UPDATE`, by batches of rows
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+UPSERT_BATCH_SIZE = 100
+
+
+def normalize_link(link: str) -> str:
+    """
+    Remove the query string & fragment from a job link, LinkedIn appends tracking parameters to the same posting
+    that change from one search to another.
+    """
+    scheme, netloc, path, _, _ = urlsplit(link)
+    return urlunsplit((scheme, netloc, path, '', ''))
+
+
+def get_description_hash(description: str) -> str:
+    """
+    Return the SHA-256 hex digest of a job description.
+    """
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory least recently used cache, whose items expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class JobRequirementsCache:
+    """
+    Two levels cache of the jobs descriptions & extracted requirements, an in-process LRU cache in front of the
+    ``JobCache`` database table. Entries are looked up by job link first, then by the description hash so the same
+    posting under a different link does not need to be analyzed again.
+
+    Expired entries are kept in the database to be revalidated: their jobs are fetched again with a conditional
+    request & keep their requirements if the posting is not modified or its description hash did not change.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 86400):
+        self.ttl = ttl
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def _get_expiry_date(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=self.ttl)
+
+    def _remember(self, link: str, entry: dict):
+        self.memory.set(('link', link), entry)
+        self.memory.set(('hash', entry['description_hash']), entry)
+
+    def load(self, jobs: list) -> list:
+        """
+        Fill the description & requirements of the cached jobs, returns the jobs that are not found in the cache.
+        The missing jobs having an expired entry get it as ``cached_entry``, to revalidate it on the next fetch.
+        """
+        missing_jobs, query_jobs = [], {}
+        for job in jobs:
+            link = normalize_link(job['link'])
+            entry = self.memory.get(('link', link))
+            if entry is None:
+                query_jobs.setdefault(link, []).append(job)
+            else:
+                job.update(description=entry['description'], requirements=entry['requirements'])
+
+        if query_jobs:
+            expiry_date = self._get_expiry_date()
+            rows = {row.link: row for row in JobCache.query.filter(JobCache.link.in_(query_jobs.keys()))}
+            for link, link_jobs in query_jobs.items():
+                row = rows.get(link)
+                if row is None or row.updated_at <= expiry_date:
+                    if row is not None:
+                        for job in link_jobs:
+                            job['cached_entry'] = row.as_dict()
+                    missing_jobs.extend(link_jobs)
+                    continue
+                entry = row.as_dict()
+                self._remember(link, entry)
+                for job in link_jobs:
+                    job.update(description=entry['description'], requirements=entry['requirements'])
+        return missing_jobs
+
+    def load_requirements(self, jobs: list) -> list:
+        """
+        Fill the requirements of the jobs whose description is already analyzed, returns the jobs that still need
+        their requirements to be extracted.
+        """
+        missing_jobs, query_jobs = [], {}
+        for job in jobs:
+            description_hash = get_description_hash(job['description'])
+            entry = self.memory.get(('hash', description_hash))
+            if entry is None or entry['requirements'] is None:
+                query_jobs.setdefault(description_hash, []).append(job)
+            else:
+                job['requirements'] = entry['requirements']
+
+        if query_jobs:
+            rows = JobCache.query.filter(JobCache.description_hash.in_(query_jobs.keys()),
+                                         JobCache.requirements.isnot(None),
+                                         JobCache.updated_at > self._get_expiry_date()).all()
+            rows = {row.description_hash: row.as_dict() for row in rows}
+            for description_hash, hash_jobs in query_jobs.items():
+                entry = rows.get(description_hash)
+                if entry is None:
+                    missing_jobs.extend(hash_jobs)
+                    continue
+                for job in hash_jobs:
+                    job['requirements'] = entry['requirements']
+        return missing_jobs
+
+    def save(self, jobs: list):
+        """
+        Store the description & requirements of the given jobs in both cache levels, the requirements of the jobs
+        scored by the phrase matcher are not extracted & stored as null.
+        """
+        entries = {}
+        for job in jobs:
+            link = normalize_link(job['link'])
+            entries[link] = {
+                'description': job['description'],
+                'description_hash': get_description_hash(job['description']),
+                'requirements': job.get('requirements'),
+                'etag': job.get('etag'),
+                'last_modified': job.get('last_modified'),
+            }
+        if entries:
+            self._upsert([dict(entry, link=link, updated_at=datetime.utcnow()) for link, entry in entries.items()])
+        for link, entry in entries.items():
+            self._remember(link, entry)
+
+    @staticmethod
+    def _upsert(rows: list):
+        """
+        Insert or update the given rows, concurrent requests may save the same new posting at the same time.
+        """
+        dialect = db.session.get_bind().dialect.name
+        if dialect in UPSERT_INSERTS:
+            for offset in range(0, len(rows), UPSERT_BATCH_SIZE):
+                statement = UPSERT_INSERTS[dialect](JobCache).values(rows[offset:offset + UPSERT_BATCH_SIZE])
+                statement = statement.on_conflict_do_update(
+                    index_elements=[JobCache.link],
+                    set_={column: statement.excluded[column] for column in rows[0] if column != 'link'},
+                )
+                db.session.execute(statement)
+            db.session.commit()
+            return
+        # Other databases merge the rows, retrying once as an update if another request inserted them first
+        for attempt in range(2):
+            try:
+                for row in rows:
+                    db.session.merge(JobCache(**row))
+                db.session.commit()
+                return
+            except IntegrityError:
+                db.session.rollback()
+                if attempt:
+                    raise
+
+    def clear(self):
+        """
+        Remove all the cached jobs.
+        """
+        self.memory.clear()
+        JobCache.query.delete()
+        db.session.commit()
+
+
+job_cache = JobRequirementsCache(maxsize=app.config['JOB_CACHE_SIZE'], ttl=app.config['JOB_CACHE_TTL'])
+
+
+class MemoryBackend:
+    """
+    Search results backend keeping the results in an in-process LRU cache, shared by the threads of one process.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300):
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key: str):
+        return self.cache.get(key)
+
+    def set(self, key: str, value: list):
+        self.cache.set(key, value)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class RedisBackend:
+    """
+    Search results backend keeping the results in Redis as JSON, shared by all the processes & servers using it.
+    The entries expire after ``ttl`` seconds, bound the used memory with the ``maxmemory`` & ``maxmemory-policy``
+    options of the Redis server. Needs the `redis` package unless a client is given.
+    """
+
+    prefix = 'job-matching:search:'
+
+    def __init__(self, url: str = 'redis://localhost:6379/0', ttl: float = 300, client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError('The redis search cache backend needs the `redis` package, pip install redis')
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+
+    def get(self, key: str):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key: str, value: list):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(int(self.ttl), 1))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+def get_search_cache_backend(name: str = None):
+    """
+    Return the configured search results backend, ``SEARCH_CACHE_BACKEND`` is either `memory` or `redis`.
+    """
+    name = name or app.config['SEARCH_CACHE_BACKEND']
+    if name == 'memory':
+        return MemoryBackend(maxsize=app.config['SEARCH_CACHE_SIZE'], ttl=app.config['SEARCH_CACHE_TTL'])
+    if name == 'redis':
+        return RedisBackend(url=app.config['SEARCH_CACHE_URL'], ttl=app.config['SEARCH_CACHE_TTL'])
+    raise ValueError(f'Unknown search cache backend {name!r}, choose one of memory, redis')
+
+
+class SearchCancelledError(httpx.TimeoutException):
+    """
+    Raised to the requests waiting for an identical search, when the search is cancelled with the event loop of the
+    request running it.
+    """
+
+
+class SearchResultsCache:
+    """
+    Cache of the parsed search results, keyed by the normalized search fields, in front of the LinkedIn search.
+
+    Concurrent identical searches are coalesced: the first one sends the requests while the others wait for its
+    results, even when the requests run on different event loops (one per request under WSGI). Failed searches are
+    not cached, their error is raised to every waiting search. A search cancelled with the event loop of its request
+    raises ``SearchCancelledError`` to the waiting ones. A ``ttl`` of 0 only coalesces the searches.
+    """
+
+    def __init__(self, backend, ttl: float = 300):
+        self.backend = backend
+        self.ttl = ttl
+        self.in_flight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(keywords: str, location: str, start: int, limit: int = None) -> str:
+        """
+        Return the cache key of a search, the URL-encoded spaces of the form & the case of the fields are ignored.
+        """
+        fields = [' '.join(unquote(str(field)).lower().split()) for field in (keywords, location)]
+        return hashlib.sha256(json.dumps(fields + [start, limit]).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def copy(jobs: list) -> list:
+        # The pipeline adds the description & requirements to the jobs, keep the cached ones untouched
+        return [dict(job) for job in jobs]
+
+    async def get_or_search(self, key: str, search) -> list:
+        """
+        Return the cached results of the search, or the results of an identical in-flight search, otherwise
+        run the ``search`` coroutine function & cache its results.
+        """
+        if self.ttl > 0:
+            jobs = self.backend.get(key)
+            if jobs is not None:
+                search_cache_lookups.inc(result='hit')
+                return self.copy(jobs)
+
+        with self._lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = concurrent.futures.Future()
+        search_cache_lookups.inc(result='miss' if leader else 'coalesced')
+        if not leader:
+            # Shielded so a request giving up on the search does not cancel it for the others
+            return self.copy(await asyncio.shield(asyncio.wrap_future(future)))
+        # The search runs detached from the leader, whose own deadline does not cancel it for the others
+        search_task = asyncio.ensure_future(self._search(key, search, future))
+        # Retrieve the error of a search left by the leader, it is raised to the other requests
+        search_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self.copy(await asyncio.shield(search_task))
+
+    async def _search(self, key: str, search, future: concurrent.futures.Future) -> list:
+        try:
+            jobs = await search()
+            if self.ttl > 0:
+                self.backend.set(key, jobs)
+            future.set_result(jobs)
+            return jobs
+        except asyncio.CancelledError:
+            # Only cancelled with its event loop, the waiting requests handle it like a timed out search
+            future.set_exception(SearchCancelledError('The identical search was cancelled'))
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self.in_flight[key]
+
+    def clear(self):
+        self.backend.clear()
+
+
+search_cache = SearchResultsCache(get_search_cache_backend(), ttl=app.config['SEARCH_CACHE_TTL'])
+
+
+class Identity(NamedTuple):
+    """
+    User fields needed by the JWT protected endpoints, cached instead of the user instances that are bound to the
+    database session of a request.
+    """
+    id: int
+    email: str
+    is_admin: bool
+
+
+class IdentityCache:
+    """
+    Short-lived cache of the identities of the active users, so the JWT protected requests do not query the
+    database each time. A deleted or deactivated user stays valid for ``ttl`` seconds at most in the other
+    processes, a ``ttl`` of 0 disables the cache.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30):
+        self.ttl = ttl
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, user_id: int) -> Identity:
+        """
+        Return the identity of the given active user, or None if the user does not exist or is inactive.
+        """
+        identity = self.memory.get(user_id) if self.ttl > 0 else None
+        if identity is None:
+            user = db.session.get(User, user_id)
+            if user is None or not user.is_active:
+                return None
+            identity = Identity(user.id, user.email, user.is_admin)
+            if self.ttl > 0:
+                self.memory.set(user_id, identity)
+        return identity
+
+    def invalidate(self, user_id: int):
+        self.memory.delete(user_id)
+
+
+identity_cache = IdentityCache(maxsize=app.config['IDENTITY_CACHE_SIZE'], ttl=app.config['IDENTITY_CACHE_TTL'])
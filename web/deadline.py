@@ -0,0 +1,62 @@
+import time
+
+from web import app
+from web.metrics import deadline_timeouts
+
+
+# Stages of a job matching request, in the order they run
+STAGES = ('search', 'detail', 'nlp')
+
+
+class Deadline:
+    """
+    Time budget of a job matching request, split across its stages by their ``shares``.
+
+    A stage gets its share of the remaining time out of the shares of the stages left, so the time a stage does not
+    use is given to the next ones & the last stage gets whatever remains. A stage running out of time records it
+    with ``expire`` & the request answers with the jobs scored so far, marked as ``partial``. Without ``timeout``
+    the stages are not bounded.
+    """
+
+    def __init__(self, timeout: float = None, shares: dict = None):
+        self.expires_at = time.monotonic() + timeout if timeout else None
+        self.shares = shares or {stage: 1.0 for stage in STAGES}
+        self.expired_stages = []
+
+    @classmethod
+    def from_config(cls) -> 'Deadline':
+        shares = {stage: app.config[f'{stage.upper()}_DEADLINE_SHARE'] for stage in STAGES}
+        return cls(app.config['REQUEST_DEADLINE'], shares)
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.expired_stages)
+
+    def remaining(self) -> float:
+        """
+        Return the seconds left before the deadline, or None if there is no deadline.
+        """
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def stage_timeout(self, stage: str) -> float:
+        """
+        Return the seconds given to the stage, or None if there is no deadline.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        total = sum(self.shares[next_stage] for next_stage in STAGES[STAGES.index(stage):])
+        return remaining * self.shares[stage] / total if total > 0 else remaining
+
+    def expire(self, stage: str):
+        # Streamed jobs may run out of time in the same stage one after the other, it is recorded once
+        if stage in self.expired_stages:
+            return
+        self.expired_stages.append(stage)
+        deadline_timeouts.inc(stage=stage)
+
+
+def get_stage_timeout(deadline: Deadline, stage: str) -> float:
+    return None if deadline is None else deadline.stage_timeout(stage)
@@ -0,0 +1,180 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+
+from web import app
+
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying, the rest of the error responses are returned as they are
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket, allows ``rate`` requests per second with bursts up to ``capacity`` requests.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token from the bucket, returns the seconds to wait before the token is available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class FetcherSession:
+    """
+    Pooled HTTP client bound to one event loop, the number of in-flight requests is capped by a semaphore.
+    """
+
+    def __init__(self, fetcher: 'Fetcher'):
+        self.fetcher = fetcher
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(fetcher.timeout),
+            limits=httpx.Limits(max_connections=fetcher.max_connections,
+                                max_keepalive_connections=fetcher.max_connections,
+                                keepalive_expiry=fetcher.keepalive_expiry),
+            follow_redirects=True,
+            transport=fetcher.transport,
+        )
+        self.semaphore = asyncio.Semaphore(fetcher.concurrency)
+        self.loop = asyncio.get_running_loop()
+
+    def get_backoff(self, attempt: int, response: httpx.Response = None) -> float:
+        """
+        Return the seconds to wait before retrying, using the ``Retry-After`` header if sent by the server,
+        otherwise an exponential backoff with full jitter.
+        """
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return min(float(retry_after), self.fetcher.backoff_max)
+        return random.uniform(0, min(self.fetcher.backoff_max, self.fetcher.backoff * 2 ** attempt))
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a GET request, retrying transport errors & retryable status codes.
+        Raises ``httpx.HTTPError`` once all the retries are exhausted.
+        """
+        bucket = self.fetcher.get_bucket(url)
+        attempt = 0
+        while True:
+            response = None
+            async with self.semaphore:
+                await bucket.acquire()
+                try:
+                    response = await self.client.get(url, **kwargs)
+                except httpx.TransportError:
+                    if attempt >= self.fetcher.retries:
+                        raise
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES or attempt >= self.fetcher.retries:
+                        return response
+            delay = self.get_backoff(attempt, response)
+            logger.debug('Retrying %s in %.2f seconds (attempt %d)', url, delay, attempt + 1)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class Fetcher:
+    """
+    Shared HTTP fetcher with connection pooling, bounded concurrency, per host rate limiting & retries.
+
+    The rate limits are shared by the whole process. The pooled client is bound to the event loop it was started on,
+    so it is reused as long as requests run on the same loop (e.g. an app-lifetime loop), otherwise a short-lived
+    session is opened for the duration of the request.
+    """
+
+    def __init__(self, concurrency: int = 10, max_connections: int = 20, keepalive_expiry: float = 30,
+                 rate: float = 5, burst: int = 10, timeout: float = 10, retries: int = 3, backoff: float = 0.5,
+                 backoff_max: float = 8, transport: httpx.AsyncBaseTransport = None):
+        self.concurrency = concurrency
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.transport = transport
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+        self._session = None
+
+    def get_bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        with self._buckets_lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return bucket
+
+    async def start(self):
+        """
+        Open the long-lived session on the running event loop.
+        """
+        if self._session is None:
+            self._session = FetcherSession(self)
+
+    async def close(self):
+        """
+        Close the long-lived session.
+        """
+        if self._session is not None:
+            session, self._session = self._session, None
+            await session.close()
+
+    @asynccontextmanager
+    async def session(self):
+        """
+        Yield the long-lived session if it is running on the current event loop, otherwise a short-lived one.
+        """
+        session = self._session
+        if session is not None and session.loop is asyncio.get_running_loop():
+            yield session
+            return
+        session = FetcherSession(self)
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+fetcher = Fetcher(
+    concurrency=app.config['FETCH_CONCURRENCY'],
+    max_connections=app.config['FETCH_MAX_CONNECTIONS'],
+    rate=app.config['FETCH_RATE'],
+    burst=app.config['FETCH_BURST'],
+    timeout=app.config['FETCH_TIMEOUT'],
+    retries=app.config['FETCH_RETRIES'],
+    backoff=app.config['FETCH_BACKOFF'],
+)
@@ -1,6 +1,11 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, IntegerRangeField
-from wtforms.validators import DataRequired, Length, Email, EqualTo, NumberRange
+from wtforms import (Form, StringField, PasswordField, IntegerRangeField, FloatField, SelectField, FieldList,
+                     FormField)
+from wtforms.validators import DataRequired, Length, Email, EqualTo, NumberRange, Optional
+
+from web import app
+from web.records import JobRecord, DESCRIPTION_MODES, format_listing
+from web.ranking import TopKSelector
 
 
 replace_space = lambda x: x.replace(' ', '%20') if isinstance(x, str) else x
@@ -26,12 +31,50 @@ class LoginForm(FlaskForm):
     password = PasswordField('Password', validators=[DataRequired()])
 
 
-class JobMatchingForm(FlaskForm):
+class ListingsForm(FlaskForm):
+    description = SelectField('Description', choices=[(mode, mode.title()) for mode in DESCRIPTION_MODES],
+                              default='full')
+    description_length = IntegerRangeField('Description Length', validators=[NumberRange(1, 10000)], default=200)
+    page = IntegerRangeField('Page', validators=[NumberRange(1)], default=1)
+    per_page = IntegerRangeField('Per Page', validators=[Optional(), NumberRange(1, 250)], default=None)
+
+    def format_listings(self, job_listings: list) -> dict:
+        """
+        Return the requested page of the given job listings - or job records - with their descriptions kept,
+        truncated or dropped. All the listings are returned if no ``per_page`` is given.
+        """
+        response = {'count': len(job_listings)}
+        if self.per_page.data:
+            offset = (self.page.data - 1) * self.per_page.data
+            job_listings = job_listings[offset:offset + self.per_page.data]
+            response.update({'page': self.page.data, 'per_page': self.per_page.data})
+        options = {'description': self.description.data, 'description_length': self.description_length.data}
+        response['job_listings'] = [job.as_listing(**options) if isinstance(job, JobRecord)
+                                    else format_listing(job, **options) for job in job_listings]
+        return response
+
+
+class SearchForm(ListingsForm):
     location = StringField('Location', validators=[DataRequired()], filters=[replace_space])
     keywords = StringField('KeyWord', validators=[DataRequired()], filters=[replace_space])
+    start = IntegerRangeField('Start', validators=[NumberRange(1, 500)], default=1)
+    limit = IntegerRangeField('Limit', validators=[Optional(), NumberRange(1, 250)], default=None)
+    top_k = IntegerRangeField('Top K', validators=[Optional(), NumberRange(1, 1000)], default=None)
+    min_score = FloatField('Min Score', validators=[Optional(), NumberRange(0)], default=None)
+
+    def get_selector(self, **kwargs) -> TopKSelector:
+        """
+        Return a selector keeping the ``top_k`` best matched jobs scoring at least ``min_score``.
+        """
+        return TopKSelector(self.top_k.data, self.min_score.data, **kwargs)
+
+
+class EmployeeCriteriaMixin:
+    """
+    Education & skills fields of an employee profile, shared by the forms matching one or many profiles.
+    """
     education = StringField('Education', validators=[DataRequired()])
     skills = StringField('KeyWord', validators=[DataRequired()], filters=[spilt_words])
-    start = IntegerRangeField('Start', validators=[NumberRange(1, 500)], default=1)
 
     @property
     def employee_criteria(self) -> dict:
@@ -39,3 +82,39 @@ class JobMatchingForm(FlaskForm):
             'skills': self.skills.data,
             'education': self.education.data,
         }
+
+
+class EmployeeCriteriaForm(EmployeeCriteriaMixin, Form):
+    pass
+
+
+class JobMatchingForm(EmployeeCriteriaMixin, SearchForm):
+    source = SelectField('Source', choices=[('live', 'Live search'), ('index', 'Job index')], default='live')
+
+
+class BulkMatchingForm(SearchForm):
+    # Sent as `profiles-0-skills`, `profiles-0-education`, `profiles-1-skills`...
+    profiles = FieldList(FormField(EmployeeCriteriaForm),
+                         validators=[Length(1, app.config['BULK_MAX_PROFILES'],
+                                            message='Between %(min)d and %(max)d profiles are accepted')])
+
+    @property
+    def employee_criteria_list(self) -> list:
+        return [profile.employee_criteria for profile in self.profiles]
+
+
+class MatchingTaskForm(JobMatchingForm):
+    # Background tasks are not bound by the request timeouts, so they accept larger searches
+    start = IntegerRangeField('Start', validators=[NumberRange(1, 1000)], default=1)
+    limit = IntegerRangeField('Limit', validators=[NumberRange(1, 1000)], default=250)
+
+    def as_params(self) -> dict:
+        return {
+            'keywords': self.keywords.data,
+            'location': self.location.data,
+            'start': self.start.data,
+            'limit': self.limit.data,
+            'employee_criteria': self.employee_criteria,
+            'top_k': self.top_k.data,
+            'min_score': self.min_score.data,
+        }
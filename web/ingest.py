@@ -0,0 +1,216 @@
+import json
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import click
+import httpx
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+from web import app, db
+from web.fetcher import fetcher
+from web.forms import replace_space
+from web.models import Job, JobTerm
+from web.cache import normalize_link
+from web.matching import NORMALIZERS
+from web.workers import PoolSaturatedError
+from web.pipeline import search_jobs, get_jobs_requirements
+
+
+logger = logging.getLogger(__name__)
+
+# Longest term kept in the inverted index, longer noun chunks are not worth matching
+MAX_TERM_LENGTH = 255
+
+
+def get_ingest_queries() -> list:
+    """
+    Return the configured searches to ingest, ``INGEST_QUERIES`` is a JSON list of objects having the `keywords`,
+    `location` & optionally `limit` keys.
+    """
+    return json.loads(app.config['INGEST_QUERIES'] or '[]')
+
+
+def get_term_normalizer():
+    return NORMALIZERS[app.config['MATCHING_MODE']]
+
+
+def index_jobs(jobs: list) -> int:
+    """
+    Store the given analyzed jobs & their normalized requirement terms, replacing the previously indexed version
+    of the same postings. Returns the number of indexed jobs.
+    """
+    normalize = get_term_normalizer()
+    for job in jobs:
+        link = normalize_link(job['link'])
+        instance = Job.query.filter_by(link=link).first()
+        if instance is None:
+            instance = Job(link=link)
+            db.session.add(instance)
+        instance.title = job['title']
+        instance.company = job['company']
+        instance.location = job.get('location')
+        instance.time = job.get('time')
+        instance.description = job['description']
+        instance.requirements = job['requirements']
+        instance.indexed_at = datetime.utcnow()
+        # Update the inverted index with the changed terms only
+        terms = {normalize(term) for term in job['requirements']}
+        terms = {term for term in terms if term and len(term) <= MAX_TERM_LENGTH}
+        indexed_terms = {job_term.term: job_term for job_term in instance.terms}
+        for term in indexed_terms.keys() - terms:
+            instance.terms.remove(indexed_terms[term])
+        instance.terms.extend(JobTerm(term=term) for term in terms - indexed_terms.keys())
+    db.session.commit()
+    return len(jobs)
+
+
+def prune_jobs(max_age: int) -> int:
+    """
+    Remove the jobs that have not been seen by the ingestion for ``max_age`` seconds. Returns the removed count.
+    """
+    expired_ids = [job_id for job_id, in db.session.query(Job.id).filter(
+        Job.indexed_at < datetime.utcnow() - timedelta(seconds=max_age))]
+    if expired_ids:
+        JobTerm.query.filter(JobTerm.job_id.in_(expired_ids)).delete(synchronize_session=False)
+        Job.query.filter(Job.id.in_(expired_ids)).delete(synchronize_session=False)
+        db.session.commit()
+    return len(expired_ids)
+
+
+async def ingest(queries: list) -> int:
+    """
+    Run the searches of the given queries through the scraping pipeline & index the found jobs.
+    A failing query is logged & skipped. Returns the number of indexed jobs.
+    """
+    indexed = 0
+    async with fetcher.session() as session:
+        for query in queries:
+            keywords, location = replace_space(query['keywords']), replace_space(query['location'])
+            try:
+                jobs = await search_jobs(session, keywords, location, query.get('start', 1), query.get('limit'))
+                jobs = await get_jobs_requirements(session, jobs, extract=True)
+            except (httpx.HTTPError, PoolSaturatedError) as exc:
+                logger.warning('Failed to ingest the query %r: %s', query, exc)
+                continue
+            indexed += index_jobs(jobs)
+    return indexed
+
+
+def run_ingestion() -> int:
+    """
+    Ingest the configured queries once, then remove the jobs no longer found.
+    """
+    with app.app_context():
+        indexed = asyncio.run(ingest(get_ingest_queries()))
+        pruned = prune_jobs(app.config['JOB_INDEX_TTL'])
+    logger.info('Indexed %d jobs, removed %d expired jobs', indexed, pruned)
+    return indexed
+
+
+def acquire_ingestion_lock():
+    """
+    Lock the ``INGEST_LOCK_FILE`` without waiting, returns the open lock file or None if another process holds it.
+    The lock is released when the file is closed or the process exits.
+    """
+    lock_file = open(app.config['INGEST_LOCK_FILE'], 'a')
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+class IngestionWorker(threading.Thread):
+    """
+    Background thread running the ingestion every ``interval`` seconds until stopped, the ``lock_file`` is kept
+    open - so locked - until then.
+    """
+
+    def __init__(self, interval: float, lock_file=None):
+        super().__init__(name='ingestion-worker', daemon=True)
+        self.interval = interval
+        self.lock_file = lock_file
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                try:
+                    run_ingestion()
+                except Exception:
+                    logger.exception('Job ingestion failed')
+                self.stopped.wait(self.interval)
+        finally:
+            if self.lock_file is not None:
+                self.lock_file.close()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_ingestion_worker():
+    """
+    Start the background ingestion if an interval & queries are configured, returns the started worker. Every worker
+    process of the server calls it, only the one taking the ingestion lock starts the ingestion.
+    """
+    if app.config['INGEST_INTERVAL'] <= 0 or not get_ingest_queries():
+        return None
+    lock_file = acquire_ingestion_lock()
+    if lock_file is None:
+        logger.info('The job ingestion is run by another process')
+        return None
+    worker = IngestionWorker(app.config['INGEST_INTERVAL'], lock_file)
+    worker.start()
+    return worker
+
+
+def match_indexed_jobs(employee_criteria: dict) -> list:
+    """
+    Score the indexed jobs against the employee criteria with the inverted index, following the same rules as
+    ``calculate_matching_score``. Returns the job listings having a positive score.
+    """
+    normalize = get_term_normalizer()
+    skill_set = {normalize(skill) for skill in employee_criteria['skills']}
+    education = normalize(employee_criteria['education'])
+    if not skill_set:
+        return []
+
+    skill_counts, educated_jobs = {}, set()
+    rows = db.session.query(JobTerm.job_id, JobTerm.term).filter(JobTerm.term.in_(skill_set | {education}))
+    for job_id, term in rows:
+        if term in skill_set:
+            skill_counts[job_id] = skill_counts.get(job_id, 0) + 1
+        if term == education:
+            educated_jobs.add(job_id)
+
+    scores = {job_id: skill_counts.get(job_id, 0) / len(skill_set) + (1.0 if job_id in educated_jobs else 0.0)
+              for job_id in skill_counts.keys() | educated_jobs}
+    jobs = Job.query.filter(Job.id.in_(scores.keys())).all() if scores else []
+    return [{'title': job.title, 'company': job.company, 'score': scores[job.id], 'description': job.description}
+            for job in jobs]
+
+
+@app.cli.command('ingest')
+@click.option('--once', is_flag=True, help='Ingest the configured queries once instead of on a schedule.')
+def ingest_command(once):
+    """Ingest the configured LinkedIn searches into the job index."""
+    if once:
+        click.echo(f'Indexed {run_ingestion()} jobs')
+        return
+    lock_file = acquire_ingestion_lock()
+    if lock_file is None:
+        raise click.ClickException('The job ingestion is already run by another process')
+    worker = IngestionWorker(app.config['INGEST_INTERVAL'] or 3600, lock_file)
+    worker.run()
@@ -0,0 +1,128 @@
+from functools import lru_cache
+from urllib.parse import unquote
+
+from spacy.matcher import PhraseMatcher
+
+from web import app
+from web.utils import get_nlp
+
+
+# Token attributes the phrase matcher can compare, the lemmas need the tagger of the pipeline to run
+MATCHER_ATTRS = ('LOWER', 'LEMMA')
+
+# Components needed to assign the lemmas
+LEMMA_COMPONENTS = ('tok2vec', 'tagger', 'attribute_ruler', 'lemmatizer')
+
+
+def normalize_phrase(phrase: str) -> str:
+    """
+    URL-decode & collapse the whitespaces of an employee criterion, e.g. ``Data%20Analysis`` from the form.
+    """
+    return ' '.join(unquote(phrase).split())
+
+
+class CriteriaMatcher:
+    """
+    Spacy ``PhraseMatcher`` compiled from the employee skills & education, scanning a job description in a single
+    pass over its tokens instead of extracting its named entities & noun chunks first.
+
+    The phrases & descriptions are compared on the lowercase form of their tokens, or on their lowercase lemmas
+    with ``attr='LEMMA'``, so ``Python`` matches ``python`` & ``Data%20Analysis`` matches ``data analysis``.
+    The scores follow the rules of ``calculate_matching_score``, except that the skills & education are looked up
+    anywhere in the description rather than in its extracted requirements.
+    """
+
+    def __init__(self, employee_criteria: dict, attr: str = 'LOWER', language=None):
+        if attr not in MATCHER_ATTRS:
+            raise ValueError(f'Unknown matcher attribute {attr!r}, choose one of {", ".join(MATCHER_ATTRS)}')
+        self.attr = attr
+        self.language = language or get_nlp()
+        # Skills differing by their case only are the same skill for the matcher
+        skills = filter(None, map(normalize_phrase, employee_criteria['skills']))
+        self.skills = list({skill.lower(): skill for skill in skills}.values())
+        self.education = normalize_phrase(employee_criteria['education'])
+        self.matcher = PhraseMatcher(self.language.vocab, attr='LOWER')
+        self.skill_keys = {}
+        for index, doc in enumerate(self.make_docs(self.skills)):
+            self.matcher.add(f'SKILL_{index}', [self.as_pattern(doc)])
+            self.skill_keys[self.language.vocab.strings[f'SKILL_{index}']] = index
+        if self.education:
+            self.matcher.add('EDUCATION', [self.as_pattern(doc) for doc in self.make_docs([self.education])])
+        self.education_key = self.language.vocab.strings.add('EDUCATION')
+
+    def make_docs(self, texts):
+        """
+        Tokenize the given texts, running the lemmatizer only when matching on lemmas.
+        """
+        if self.attr == 'LOWER':
+            return self.language.tokenizer.pipe(texts)
+        disabled = [name for name in self.language.pipe_names if name not in LEMMA_COMPONENTS]
+        return self.language.pipe(texts, disable=disabled)
+
+    def as_pattern(self, doc):
+        """
+        Return the pattern of a phrase, with lemma matching the lowercase lemmas replace the tokens text.
+        """
+        if self.attr == 'LOWER':
+            return doc
+        return self.language.make_doc(' '.join(token.lemma_ for token in doc))
+
+    def score_doc(self, doc) -> float:
+        if self.attr == 'LEMMA':
+            doc = self.as_pattern(doc)
+        matched_skills, education_score = set(), 0.0
+        for key, _, _ in self.matcher(doc):
+            if key == self.education_key:
+                education_score = 1.0
+            else:
+                matched_skills.add(self.skill_keys[key])
+        return len(matched_skills) / len(self.skills) + education_score
+
+    def score(self, job_descriptions: list) -> list:
+        """
+        Calculate the matching score of each description, in the given order.
+        """
+        if not self.skills:
+            return [0.0] * len(job_descriptions)
+        return [self.score_doc(doc) for doc in self.make_docs(job_descriptions)]
+
+    def score_docs(self, docs: list) -> list:
+        """
+        Calculate the matching score of descriptions already made into docs by ``make_docs``.
+        """
+        if not self.skills:
+            return [0.0] * len(docs)
+        return [self.score_doc(doc) for doc in docs]
+
+
+@lru_cache(maxsize=128)
+def compile_matcher(skills: tuple, education: str, attr: str) -> CriteriaMatcher:
+    return CriteriaMatcher({'skills': skills, 'education': education}, attr=attr)
+
+
+def get_criteria_matcher(employee_criteria: dict) -> CriteriaMatcher:
+    """
+    Return the ``CriteriaMatcher`` of the employee criteria, compiled on the first call & reused by the next ones,
+    e.g. for each job of a streamed request.
+    """
+    return compile_matcher(tuple(employee_criteria['skills']), employee_criteria['education'],
+                           app.config['PHRASE_MATCHER_ATTR'])
+
+
+def match_job_descriptions(employee_criteria: dict, job_descriptions: list) -> list:
+    """
+    Calculate the matching score of many job descriptions at once with a ``CriteriaMatcher``.
+    """
+    return get_criteria_matcher(employee_criteria).score(job_descriptions)
+
+
+def match_many_job_descriptions(employee_criteria_list: list, job_descriptions: list) -> list:
+    """
+    Calculate the matching score of many job descriptions for many employee criteria, the descriptions are made
+    into docs once & scanned by the matcher of each criteria. Returns a list of scores per employee criteria.
+    """
+    matchers = [get_criteria_matcher(criteria) for criteria in employee_criteria_list]
+    if not matchers:
+        return []
+    docs = list(matchers[0].make_docs(job_descriptions))
+    return [matcher.score_docs(docs) for matcher in matchers]
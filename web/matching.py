@@ -0,0 +1,171 @@
+from itertools import chain
+from urllib.parse import unquote
+
+import numpy as np
+
+from web.metrics import timed
+
+
+def normalize_exact(term: str) -> str:
+    return term
+
+
+def normalize_lower(term: str) -> str:
+    """
+    URL-decode, lowercase & collapse the whitespaces of a term, so ``Data%20Analysis`` matches ``data analysis``.
+    """
+    return ' '.join(unquote(term).lower().split())
+
+
+# Available normalization modes, `exact` keeps the semantics of `calculate_matching_score`, the phrase matcher
+# compares lowercase tokens so the requirements of the job index are normalized the same way in `phrase` mode
+NORMALIZERS = {
+    'exact': normalize_exact,
+    'lower': normalize_lower,
+    'phrase': normalize_lower,
+}
+
+
+class JobIndex:
+    """
+    Vocabulary indexed requirements of many jobs, used to score all of them against employee criteria at once.
+
+    The requirement terms are normalized & mapped to integer ids once, each job is stored as the sorted unique ids of
+    its terms (a sparse row in CSR layout), so scoring a set of criteria is a couple of NumPy operations over all the
+    jobs instead of building Python sets per job.
+    """
+
+    def __init__(self, jobs_requirements: list, mode: str = 'exact'):
+        if mode not in NORMALIZERS:
+            raise ValueError(f'Unknown matching mode {mode!r}, choose one of {", ".join(NORMALIZERS)}')
+        self.mode = mode
+        self.normalize = NORMALIZERS[mode]
+        self.vocabulary = {}
+        # Map every term to its id in one pass, then drop the repeated terms of each job
+        terms = (term for job_requirements in jobs_requirements for term in job_requirements)
+        if self.normalize is not normalize_exact:
+            terms = map(self.normalize, terms)
+        term_ids = np.fromiter((self.vocabulary.setdefault(term, len(self.vocabulary)) for term in terms),
+                               dtype=np.int64)
+        lengths = np.fromiter((len(job_requirements) for job_requirements in jobs_requirements), dtype=np.int64,
+                              count=len(jobs_requirements))
+        self.set_rows(term_ids, lengths)
+
+    @classmethod
+    def from_records(cls, jobs: list, vocabulary) -> 'JobIndex':
+        """
+        Build the index of job records whose requirements are already interned in the given ``TermVocabulary``,
+        the terms ids are reused as they are.
+        """
+        index = cls.__new__(cls)
+        index.mode = vocabulary.mode
+        index.normalize = vocabulary.normalize
+        index.vocabulary = vocabulary.ids
+        term_ids = np.frombuffer(b''.join(job.term_ids.tobytes() for job in jobs), dtype=np.int64)
+        lengths = np.fromiter((len(job.term_ids) for job in jobs), dtype=np.int64, count=len(jobs))
+        index.set_rows(term_ids, lengths)
+        return index
+
+    def set_rows(self, term_ids: np.ndarray, lengths: np.ndarray):
+        """
+        Store the sorted unique term ids of each job, given the concatenated term ids & the number of terms per job.
+        """
+        self.size = len(lengths)
+        rows = np.repeat(np.arange(self.size, dtype=np.int64), lengths)
+        keys = np.unique(rows * max(len(self.vocabulary), 1) + term_ids)
+        self.rows, self.indices = np.divmod(keys, max(len(self.vocabulary), 1))
+
+    def __len__(self):
+        return self.size
+
+    def get_criteria_vector(self, terms) -> np.ndarray:
+        """
+        Return a vector over the vocabulary, set to 1 for the given terms that appear in any job.
+        """
+        vector = np.zeros(len(self.vocabulary), dtype=np.float64)
+        term_ids = [self.vocabulary[term] for term in terms if term in self.vocabulary]
+        vector[term_ids] = 1.0
+        return vector
+
+    def count_matches(self, vector: np.ndarray) -> np.ndarray:
+        """
+        Return the number of terms of each job that are set in the given vocabulary vector.
+        """
+        return np.bincount(self.rows, weights=vector[self.indices], minlength=self.size)
+
+    def score(self, employee_criteria: dict) -> np.ndarray:
+        """
+        Calculate the matching score of every job, following the same rules as ``calculate_matching_score``:
+        the ratio of the employee's skills found in the job requirements, plus 1 if the education is found.
+        """
+        skill_set = {self.normalize(skill) for skill in employee_criteria['skills']}
+        if not skill_set:
+            return np.zeros(self.size, dtype=np.float64)
+        skill_score = self.count_matches(self.get_criteria_vector(skill_set)) / len(skill_set)
+        education = self.normalize(employee_criteria['education'])
+        education_score = (self.count_matches(self.get_criteria_vector([education])) > 0).astype(np.float64)
+        return skill_score + education_score
+
+    def score_many(self, employee_criteria_list: list) -> np.ndarray:
+        """
+        Calculate the matching score of every job for many employee criteria at once, with the same rules as
+        ``score``. Returns a matrix with a row per employee criteria & a column per job.
+
+        The criteria are turned into weight matrices over the terms they share with the jobs, the skills weighted by
+        the inverse of their number & the education by 1, so all the scores are two matrix products with the
+        incidence matrix of these terms in the jobs.
+        """
+        skill_sets = [{self.normalize(skill) for skill in criteria['skills']} for criteria in employee_criteria_list]
+        educations = [self.normalize(criteria['education']) for criteria in employee_criteria_list]
+        # Columns of the criteria terms found in any job, the others can not match
+        columns = {}
+        for term in chain(chain.from_iterable(skill_sets), educations):
+            if term in self.vocabulary:
+                columns.setdefault(self.vocabulary[term], len(columns))
+
+        skill_weights = np.zeros((len(employee_criteria_list), len(columns)), dtype=np.float64)
+        education_weights = np.zeros((len(employee_criteria_list), len(columns)), dtype=np.float64)
+        for row, (skill_set, education) in enumerate(zip(skill_sets, educations)):
+            # Criteria without skills score 0, like in `score`
+            if not skill_set:
+                continue
+            for skill in skill_set & self.vocabulary.keys():
+                skill_weights[row, columns[self.vocabulary[skill]]] = 1.0 / len(skill_set)
+            if education in self.vocabulary:
+                education_weights[row, columns[self.vocabulary[education]]] = 1.0
+
+        column_ids = np.full(len(self.vocabulary), -1, dtype=np.int64)
+        column_ids[list(columns.keys())] = list(columns.values())
+        job_columns = column_ids[self.indices]
+        matched = job_columns >= 0
+        incidence = np.zeros((len(columns), self.size), dtype=np.float64)
+        incidence[job_columns[matched], self.rows[matched]] = 1.0
+        return skill_weights @ incidence + (education_weights @ incidence > 0)
+
+
+@timed('score')
+def calculate_matching_scores(employee_criteria: dict, jobs_requirements: list, mode: str = 'exact') -> list:
+    """
+    Calculate the matching score of many jobs at once, returns a list of scores in the order of the given jobs.
+    """
+    return JobIndex(jobs_requirements, mode=mode).score(employee_criteria).tolist()
+
+
+def calculate_records_scores(employee_criteria: dict, jobs: list, vocabulary) -> list:
+    """
+    Calculate the matching score of job records one by one, with the rules of ``calculate_matching_score`` applied to
+    the term ids interned in the given ``TermVocabulary``. For a single employee criteria this is faster than
+    building a ``JobIndex`` first, which pays off when the index is reused, e.g. by ``JobIndex.score_many``.
+    """
+    skill_set = {vocabulary.normalize(skill) for skill in employee_criteria['skills']}
+    if not skill_set:
+        return [0.0] * len(jobs)
+    # Criteria terms missing from the vocabulary can not match any job
+    skill_ids = {vocabulary.ids[skill] for skill in skill_set if skill in vocabulary.ids}
+    education_id = vocabulary.ids.get(vocabulary.normalize(employee_criteria['education']))
+    scores = []
+    for job in jobs:
+        term_ids = set(job.term_ids)
+        education_score = 1.0 if education_id in term_ids else 0.0
+        scores.append(len(skill_ids.intersection(term_ids)) / len(skill_set) + education_score)
+    return scores
@@ -0,0 +1,219 @@
+import time
+import inspect
+import threading
+import contextvars
+from functools import wraps
+from contextlib import contextmanager
+
+
+# Default buckets of the histograms, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Duration of each stage in the current request, keyed by stage name
+request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def format_labels(labelnames: tuple, labelvalues: tuple, **extra) -> str:
+    labels = list(zip(labelnames, labelvalues)) + list(extra.items())
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def get_labelvalues(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def collect(self) -> list:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines.extend(self.collect())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        labelvalues = self.get_labelvalues(labels)
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self.get_labelvalues(labels), 0)
+
+    def collect(self) -> list:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{format_labels(self.labelnames, labelvalues)} {value}' for labelvalues, value in values]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        labelvalues = self.get_labelvalues(labels)
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value: float, **labels):
+        labelvalues = self.get_labelvalues(labels)
+        with self._lock:
+            bucket_counts, total, count = self._values.get(labelvalues, ((0,) * len(self.buckets), 0.0, 0))
+            bucket_counts = tuple(bucket_count + (value <= bound)
+                                  for bound, bucket_count in zip(self.buckets, bucket_counts))
+            self._values[labelvalues] = (bucket_counts, total + value, count + 1)
+
+    def get_count(self, **labels) -> int:
+        return self._values.get(self.get_labelvalues(labels), (None, 0.0, 0))[2]
+
+    def collect(self) -> list:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = []
+        for labelvalues, (bucket_counts, total, count) in values:
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f'{self.name}_bucket{format_labels(self.labelnames, labelvalues, le=bound)} '
+                             f'{bucket_count}')
+            lines.append(f'{self.name}_bucket{format_labels(self.labelnames, labelvalues, le="+Inf")} {count}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, labelvalues)} {total}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, labelvalues)} {count}')
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Return all the registered metrics in the Prometheus text exposition format.
+        """
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+
+registry = Registry()
+
+stage_duration = registry.register(Histogram(
+    'job_matching_stage_duration_seconds', 'Duration of the job matching stages.', ('stage',)))
+fetch_failures = registry.register(Counter(
+    'job_matching_fetch_failures_total', 'LinkedIn requests that failed after the retries.', ('kind',)))
+search_cache_lookups = registry.register(Counter(
+    'job_matching_search_cache_lookups_total', 'Search results cache lookups by result.', ('result',)))
+detail_revalidations = registry.register(Counter(
+    'job_matching_detail_revalidations_total', 'Expired job details fetched again, by whether they changed.',
+    ('result',)))
+skipped_descriptions = registry.register(Counter(
+    'job_matching_skipped_descriptions_total', 'Jobs skipped because their description could not be found.'))
+long_descriptions = registry.register(Counter(
+    'job_matching_long_descriptions_total', 'Descriptions over the NLP length limit, by the action taken.',
+    ('action',)))
+deadline_timeouts = registry.register(Counter(
+    'job_matching_deadline_timeouts_total', 'Requests answered partially because a stage ran out of time.',
+    ('stage',)))
+detail_request_duration = registry.register(Histogram(
+    'job_matching_detail_request_duration_seconds', 'Duration of each job detail page request.'))
+request_duration = registry.register(Histogram(
+    'http_request_duration_seconds', 'Duration of the HTTP requests.', ('endpoint', 'method', 'status')))
+startup_duration = registry.register(Gauge(
+    'process_startup_duration_seconds', 'Duration of the setup of the application & of the Spacy model loading.',
+    ('phase',)))
+
+
+def record_stage(stage: str, duration: float):
+    """
+    Record the duration of a stage, in the global metrics & the timings of the current request if any.
+    """
+    stage_duration.observe(duration, stage=stage)
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + duration
+
+
+@contextmanager
+def stage_timer(stage: str):
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started_at)
+
+
+@contextmanager
+def duration_timer(histogram: Histogram, **labels):
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started_at, **labels)
+
+
+def timed_calls(timer):
+    """
+    Decorator running each call of the decorated function - sync or async - in a new ``timer()`` context.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timer():
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer():
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed(stage: str):
+    """
+    Decorator recording the duration of each call of the decorated function - sync or async - as the given stage.
+    """
+    return timed_calls(lambda: stage_timer(stage))
+
+
+def observed(histogram: Histogram, **labels):
+    """
+    Decorator observing the duration of each call in the given histogram only, for the functions running
+    concurrently within a request: their durations add up to more than the wall-clock time of the request timings.
+    """
+    return timed_calls(lambda: duration_timer(histogram, **labels))
+
+
+def format_server_timing(timings: dict) -> str:
+    """
+    Format the stages timings as a ``Server-Timing`` header value, durations are in milliseconds.
+    """
+    return ', '.join(f'{stage};dur={duration * 1000:.1f}' for stage, duration in timings.items())
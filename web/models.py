@@ -1,13 +1,15 @@
+import uuid
 from datetime import datetime
 
 from web import db
+from web.security import password_hasher
 
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(20), unique=True, nullable=False)
     email = db.Column(db.String(50), unique=True, nullable=False)
-    password = db.Column(db.String(60), nullable=False)
+    password = db.Column(db.String(128), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -30,12 +32,20 @@ class User(db.Model):
     @classmethod
     def create_super_user(cls, **kwargs):
         kwargs.setdefault('is_admin', True)
-        return cls(**kwargs)
+        return cls.create_user(**kwargs)
 
     @classmethod
-    def create_user(cls, **kwargs):
+    def create_user(cls, password: str = None, password_hash: str = None, **kwargs):
+        """
+        Create a user with the given password, or with the given ``password_hash`` if it is already hashed.
+        """
         kwargs.setdefault('is_admin', False)
-        return cls(**kwargs)
+        if password_hash is None and password is not None:
+            password_hash = password_hasher.hash(password)
+        return cls(password=password_hash, **kwargs)
+
+    def check_password(self, password: str) -> bool:
+        return password_hasher.verify(self.password, password)
 
     def as_dict(self) -> dict:
         return {
@@ -49,15 +59,126 @@ class User(db.Model):
         }
 
 
-def user_exists(email: str, password: str) -> User:
+def user_exists(email: str, password: str = None) -> User:
     """
-    Check if a user exists in the database with the given email and password.
+    Check if a user exists in the database with the given email, and the given password if any.
+    The user is looked up by the email index only, the password is verified against its hash.
 
     Args:
         email (str): The email to check.
-        password (str): The password to check.
+        password (str): The password to check, optional.
 
     Returns:
         User: The user instance if found, or None if not found.
     """
-    return User.query.filter_by(email=email, password=password).first()
+    user = User.query.filter_by(email=email).first()
+    if password is not None and (user is None or not user.check_password(password)):
+        return None
+    return user
+
+
+class JobCache(db.Model):
+    link = db.Column(db.String(500), primary_key=True)
+    description_hash = db.Column(db.String(64), index=True, nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    requirements = db.Column(db.JSON(none_as_null=True), nullable=True)
+    # Validators of the detail page, sent back to LinkedIn to revalidate the expired entries
+    etag = db.Column(db.String(255))
+    last_modified = db.Column(db.String(64))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<JobCache {self.link}>'
+
+    def as_dict(self) -> dict:
+        return {
+            'description': self.description,
+            'description_hash': self.description_hash,
+            'requirements': self.requirements,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+        }
+
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    link = db.Column(db.String(500), unique=True, nullable=False)
+    title = db.Column(db.String(255), nullable=False)
+    company = db.Column(db.String(255), nullable=False)
+    location = db.Column(db.String(255))
+    time = db.Column(db.String(50))
+    description = db.Column(db.Text, nullable=False)
+    requirements = db.Column(db.JSON, nullable=False)
+    indexed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    terms = db.relationship('JobTerm', backref='job', cascade='all, delete-orphan', lazy=True)
+
+    def __repr__(self):
+        return f'<Job {self.link}>'
+
+    def as_dict(self) -> dict:
+        return {
+            'link': self.link,
+            'title': self.title,
+            'company': self.company,
+            'location': self.location,
+            'time': self.time,
+            'description': self.description,
+            'requirements': self.requirements,
+        }
+
+
+class JobTerm(db.Model):
+    """
+    Inverted index of the jobs, maps each normalized requirement term to the jobs requiring it.
+    """
+    __table_args__ = (db.UniqueConstraint('term', 'job_id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.String(255), nullable=False, index=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('job.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<JobTerm {self.term}>'
+
+
+class MatchingTask(db.Model):
+    """
+    Job matching run in the background, its progress & results are updated after each batch of jobs.
+    """
+    PENDING, RUNNING, SUCCEEDED, FAILED, CANCELLED = 'pending', 'running', 'succeeded', 'failed', 'cancelled'
+    FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default=PENDING, index=True)
+    params = db.Column(db.JSON, nullable=False)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    results = db.Column(db.JSON, nullable=False, default=list)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<MatchingTask {self.id}>'
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in self.FINISHED_STATUSES
+
+    def as_dict(self) -> dict:
+        results = self.results or []
+        return {
+            'id': self.id,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'job_listings': results,
+            # Ids of the job listings sorted the same way as the `job_matching` listings, once the task succeeded
+            'ranking': sorted(range(len(results)), key=lambda i: results[i]['score'], reverse=True)
+            if self.status == self.SUCCEEDED else None,
+        }
@@ -1,11 +1,54 @@
 import asyncio
+import logging
 
 import httpx
+import lxml.html
+from lxml import etree
 from bs4 import BeautifulSoup
 
+from web import app
+from web.fetcher import fetcher
+from web.cache import get_description_hash
+from web.metrics import timed, observed, stage_timer, fetch_failures, detail_revalidations, detail_request_duration
 
-def parse_search_response(response):
-    soup = BeautifulSoup(response.text, 'html.parser')
+
+logger = logging.getLogger(__name__)
+
+
+def has_class(class_name):
+    """
+    Return an XPath predicate matching the elements having the given class among their classes.
+    """
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+# Compiled XPath expressions used by the lxml backend, they mirror the BeautifulSoup lookups
+JOB_CARDS_XPATH = etree.XPath(f"//div[{has_class('base-card')}]")
+JOB_LINK_XPATH = etree.XPath(f".//a[{has_class('base-card__full-link')}]")
+CARD_INFO_XPATH = etree.XPath(f".//div[{has_class('base-search-card__info')}]")
+TITLE_XPATH = etree.XPath(f".//h3[{has_class('base-search-card__title')}]")
+LOCATION_XPATH = etree.XPath(f".//span[{has_class('job-search-card__location')}]")
+TIME_XPATH = etree.XPath(f".//time[{has_class('job-search-card__listdate')}]")
+COMPANY_XPATH = etree.XPath(f".//h4[{has_class('base-search-card__subtitle')}]")
+DESCRIPTION_XPATH = etree.XPath(f"//div[{has_class('show-more-less-html__markup')}]")
+
+
+def find_first(xpath, element):
+    result = xpath(element)
+    return result[0] if result else None
+
+
+def parse_html_document(text):
+    """
+    Parse an HTML document or fragment with lxml, returns None for empty documents.
+    """
+    if not text or not text.strip():
+        return None
+    return lxml.html.document_fromstring(text)
+
+
+def parse_search_html_soup(text):
+    soup = BeautifulSoup(text, 'html.parser')
     all_jobs_html = soup.find_all('div', class_='base-card')
     jobs = []
     for job_html in all_jobs_html:
@@ -27,16 +70,127 @@ def parse_search_response(response):
     return jobs
 
 
-async def send_detail_request(session, job):
-    response = await session.get(job['link'])
-    soup = BeautifulSoup(response.text, 'html.parser')
+def parse_search_html_lxml(text):
+    document = parse_html_document(text)
+    if document is None:
+        return []
+    jobs = []
+    for job_html in JOB_CARDS_XPATH(document):
+        link = find_first(JOB_LINK_XPATH, job_html).get('href')
+        card_info = find_first(CARD_INFO_XPATH, job_html)
+        time = find_first(TIME_XPATH, card_info)
+        jobs.append({
+            'link': link,
+            'title': find_first(TITLE_XPATH, card_info).text_content().strip(),
+            'location': find_first(LOCATION_XPATH, card_info).text_content().strip(),
+            'company': find_first(COMPANY_XPATH, card_info).text_content().strip(),
+            'time': time if time is None else time.text_content().strip()
+        })
+    return jobs
+
+
+def parse_detail_html_soup(text):
+    soup = BeautifulSoup(text, 'html.parser')
     des = soup.find('div', class_='show-more-less-html__markup')
-    job['description'] = des if des is None else des.text.strip()
+    # Separate the text of the elements, so the end of a paragraph or list item is not glued to the next one
+    return des if des is None else des.get_text(' ').strip()
+
+
+def parse_detail_html_lxml(text):
+    document = parse_html_document(text)
+    des = None if document is None else find_first(DESCRIPTION_XPATH, document)
+    return des if des is None else ' '.join(des.itertext()).strip()
+
+
+# Available parser backends, both return the same output
+PARSER_BACKENDS = {
+    'html.parser': (parse_search_html_soup, parse_detail_html_soup),
+    'lxml': (parse_search_html_lxml, parse_detail_html_lxml),
+}
+
+
+def get_parser_backend(backend=None):
+    backend = backend or app.config['PARSER_BACKEND']
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f'Unknown parser backend {backend!r}, choose one of {", ".join(PARSER_BACKENDS)}')
+    return PARSER_BACKENDS[backend]
+
+
+@timed('parse_search')
+def parse_search_html(text, backend=None):
+    return get_parser_backend(backend)[0](text)
+
+
+@timed('parse_detail')
+def parse_detail_html(text, backend=None):
+    return get_parser_backend(backend)[1](text)
+
+
+def parse_search_response(response, backend=None):
+    return parse_search_html(response.text, backend)
+
+
+def get_conditional_headers(entry: dict) -> dict:
+    """
+    Return the headers revalidating the given cached entry, empty if it has no validators.
+    """
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+@observed(detail_request_duration)
+async def send_detail_request(session, job):
+    """
+    Fetch & parse the description of the job. A job having an expired ``cached_entry`` is fetched with a
+    conditional request & keeps the cached requirements if the page is not modified or its description is the
+    same, so only the changed descriptions are analyzed again.
+    """
+    entry = job.pop('cached_entry', None)
+    try:
+        response = await session.get(job['link'], headers=get_conditional_headers(entry))
+        if entry is None or response.status_code != httpx.codes.NOT_MODIFIED:
+            response.raise_for_status()
+    except httpx.HTTPError as exc:
+        # A failed page is left without a description instead of failing the other requests
+        logger.warning('Failed to fetch job details %s: %s', job['link'], exc)
+        fetch_failures.inc(kind='detail')
+        job['description'] = None
+        return job
+
+    job['etag'] = response.headers.get('ETag', entry and entry['etag'])
+    job['last_modified'] = response.headers.get('Last-Modified', entry and entry['last_modified'])
+    if response.status_code == httpx.codes.NOT_MODIFIED:
+        detail_revalidations.inc(result='not_modified')
+        job.update(description=entry['description'], requirements=entry['requirements'])
+        return job
+    job['description'] = parse_detail_html(response.text)
+    if entry is not None:
+        unchanged = (job['description'] is not None
+                     and get_description_hash(job['description']) == entry['description_hash'])
+        detail_revalidations.inc(result='unchanged' if unchanged else 'changed')
+        if unchanged:
+            job['requirements'] = entry['requirements']
     return job
 
 
-async def get_detail_responses(jobs):
-    async with httpx.AsyncClient() as session:
-        tasks = [send_detail_request(session, job) for job in jobs]
-        result = await asyncio.gather(*tasks, return_exceptions=False)
-    return result
+async def get_detail_responses(jobs, session=None, timeout=None):
+    """
+    Fetch the descriptions of the given jobs concurrently, returns the jobs whose request completed. Requests still
+    running after ``timeout`` seconds are cancelled, so a slow page does not hold up the others.
+    """
+    if session is None:
+        async with fetcher.session() as session:
+            return await get_detail_responses(jobs, session, timeout)
+    if not jobs:
+        return []
+    tasks = [asyncio.ensure_future(send_detail_request(session, job)) for job in jobs]
+    with stage_timer('detail'):
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    return [task.result() for task in tasks if task in done]
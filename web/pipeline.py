@@ -0,0 +1,258 @@
+import math
+import asyncio
+
+import httpx
+import numpy as np
+
+from web import app
+from web.cache import job_cache, search_cache, normalize_link, SearchCancelledError
+from web.metrics import timed, fetch_failures, skipped_descriptions, long_descriptions
+from web.deadline import Deadline, get_stage_timeout
+from web.workers import nlp_pool
+from web.matching import JobIndex, calculate_records_scores
+from web.parser import parse_search_response, get_detail_responses, send_detail_request
+from web.records import JobRecord, TermVocabulary
+
+
+def get_search_url(keywords: str, location: str, start: int) -> str:
+    return (f'{app.config["LINKEDIN_BASE_URL"]}/jobs-guest/jobs/api/seeMoreJobPostings/search'
+            f'?keywords={keywords}&location={location}&start={start}')
+
+
+@timed('search')
+async def search_page(session, keywords: str, location: str, start: int) -> list:
+    """
+    Send the search request of one page & parse the found jobs. Raises ``httpx.HTTPError`` if the request fails.
+    """
+    response = await session.get(get_search_url(keywords, location, start))
+    # A page still throttled or failing after the retries is an error, not an empty page
+    response.raise_for_status()
+    return parse_search_response(response)
+
+
+def deduplicate_jobs(jobs: list) -> list:
+    """
+    Remove the jobs found more than once, jobs are compared by their link without the tracking parameters.
+    """
+    links, unique_jobs = set(), []
+    for job in jobs:
+        link = normalize_link(job['link'])
+        if link not in links:
+            links.add(link)
+            unique_jobs.append(job)
+    return unique_jobs
+
+
+async def search_jobs(session, keywords: str, location: str, start: int, limit: int = None) -> list:
+    """
+    Search for jobs starting from ``start``, fetching as many pages as needed - concurrently - to reach ``limit``
+    unique jobs, a single page is fetched if no limit is given. Pages that fail - transport errors or error statuses
+    left after the retries - are skipped & counted, ``httpx.HTTPError`` is raised only if all of them fail.
+    """
+    page_size = app.config['SEARCH_PAGE_SIZE']
+    pages = 1 if not limit else min(math.ceil(limit / page_size), app.config['SEARCH_MAX_PAGES'])
+    results = await asyncio.gather(*[search_page(session, keywords, location, start + page * page_size)
+                                     for page in range(pages)], return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(result, httpx.HTTPError):
+            raise result
+        if isinstance(result, httpx.HTTPError):
+            fetch_failures.inc(kind='search')
+    pages_jobs = [result for result in results if not isinstance(result, BaseException)]
+    if not pages_jobs:
+        raise results[0]
+    jobs = deduplicate_jobs([job for page_jobs in pages_jobs for job in page_jobs])
+    return jobs[:limit] if limit else jobs
+
+
+def uses_phrase_matcher() -> bool:
+    """
+    Return whether the jobs are scored by the phrase matcher, which needs the descriptions only.
+    """
+    return app.config['MATCHING_MODE'] == 'phrase'
+
+
+async def get_search_results(session, keywords: str, location: str, start: int, limit: int = None,
+                             deadline: Deadline = None) -> list:
+    """
+    Cached version of ``search_jobs``, identical searches share their results while they are fresh & concurrent
+    identical searches send the requests once. No jobs are found if the search stage of the ``deadline`` runs out,
+    or if the identical search this one waits for is cancelled because its own request ran out of time.
+    """
+    key = search_cache.get_key(keywords, location, start, limit)
+    search = search_cache.get_or_search(key, lambda: search_jobs(session, keywords, location, start, limit))
+    try:
+        return await asyncio.wait_for(search, get_stage_timeout(deadline, 'search'))
+    except (asyncio.TimeoutError, SearchCancelledError):
+        if deadline is None:
+            raise
+        deadline.expire('search')
+        return []
+
+
+def limit_descriptions(jobs: list) -> tuple:
+    """
+    Return the jobs to analyze & their descriptions, truncated to ``NLP_MAX_DESCRIPTION_LENGTH`` characters.
+    With ``NLP_LONG_DESCRIPTIONS=skip`` the jobs having a longer description get no requirements instead.
+    """
+    max_length = app.config['NLP_MAX_DESCRIPTION_LENGTH']
+    if not max_length:
+        return jobs, [job['description'] for job in jobs]
+    skip = app.config['NLP_LONG_DESCRIPTIONS'] == 'skip'
+    analyzed_jobs, descriptions = [], []
+    for job in jobs:
+        description = job['description']
+        if len(description) > max_length:
+            long_descriptions.inc(action='skip' if skip else 'truncate')
+            if skip:
+                job['requirements'] = []
+                continue
+            description = description[:max_length]
+        analyzed_jobs.append(job)
+        descriptions.append(description)
+    return analyzed_jobs, descriptions
+
+
+async def extract_requirements(jobs: list, deadline: Deadline = None) -> list:
+    """
+    Fill the requirements of the given jobs, reusing the already analyzed descriptions. Returns the jobs whose
+    requirements had to be extracted. The jobs are left without requirements if the NLP stage of the ``deadline``
+    runs out.
+    Raises ``PoolSaturatedError`` if the NLP worker pool can not accept the extraction.
+    """
+    pending_jobs = job_cache.load_requirements([job for job in jobs if job.get('requirements') is None])
+    analyzed_jobs, descriptions = limit_descriptions(pending_jobs)
+    # Extract the requirements of the remaining jobs in a single batch, away from the event loop
+    try:
+        jobs_requirements = await asyncio.wait_for(nlp_pool.extract_jobs_requirements(descriptions),
+                                                   get_stage_timeout(deadline, 'nlp'))
+    except asyncio.TimeoutError:
+        if deadline is None:
+            raise
+        deadline.expire('nlp')
+        return [job for job in pending_jobs if job.get('requirements') is not None]
+    for job, job_requirements in zip(analyzed_jobs, jobs_requirements):
+        job['requirements'] = job_requirements
+    return pending_jobs
+
+
+async def get_jobs_requirements(session, jobs: list, extract: bool = None, deadline: Deadline = None) -> list:
+    """
+    Fill the description & requirements of the given jobs, from the cache or by fetching & analyzing their details.
+    The requirements are not extracted if ``extract`` is false, by default when the phrase matcher is used.
+    Returns the jobs that have a description, in the given order. Once a stage of the ``deadline`` runs out, the
+    jobs not fetched yet are left out & the jobs not analyzed yet are left without requirements.
+    """
+    if extract is None:
+        extract = not uses_phrase_matcher()
+    # Fill the cached jobs, then send other requests to get the details of the remaining ones
+    missing_jobs = job_cache.load(jobs)
+    fetched_jobs = await get_detail_responses(missing_jobs, session, get_stage_timeout(deadline, 'detail'))
+    if len(fetched_jobs) < len(missing_jobs):
+        deadline.expire('detail')
+
+    # Keep jobs that have a description, then extract & cache the requirements of the fetched ones
+    jobs = [job for job in jobs if job.get('description', None) is not None]
+    skipped_descriptions.inc(sum(job['description'] is None for job in fetched_jobs))
+    changed_jobs = {id(job): job for job in fetched_jobs if job['description'] is not None}
+    if extract:
+        changed_jobs.update((id(job), job) for job in await extract_requirements(jobs, deadline))
+    job_cache.save(list(changed_jobs.values()))
+    return jobs
+
+
+async def iter_jobs_requirements(session, jobs: list, extract: bool = None, deadline: Deadline = None):
+    """
+    Asynchronous generator version of ``get_jobs_requirements``, yields the jobs as soon as their requirements are
+    ready: the cached jobs first, then the fetched jobs in order of completion, until the ``deadline`` runs out.
+    """
+    if extract is None:
+        extract = not uses_phrase_matcher()
+    missing_jobs = job_cache.load(jobs)
+    cached_jobs = [job for job in jobs if 'description' in job]
+    if extract:
+        job_cache.save(await extract_requirements(cached_jobs, deadline))
+    for job in cached_jobs:
+        yield job
+
+    fetched_jobs = []
+    tasks = [asyncio.ensure_future(send_detail_request(session, job)) for job in missing_jobs]
+    try:
+        for detail_request in asyncio.as_completed(tasks, timeout=get_stage_timeout(deadline, 'detail')):
+            try:
+                job = await detail_request
+            except asyncio.TimeoutError:
+                deadline.expire('detail')
+                break
+            if job.get('description', None) is None:
+                skipped_descriptions.inc()
+                continue
+            if extract:
+                await extract_requirements([job], deadline)
+            fetched_jobs.append(job)
+            yield job
+    finally:
+        # Stop the remaining requests in case the consumer stops early
+        for task in tasks:
+            task.cancel()
+        if fetched_jobs:
+            job_cache.save(fetched_jobs)
+
+
+async def get_job_records(session, jobs: list, vocabulary: TermVocabulary, deadline: Deadline = None) -> list:
+    """
+    Version of ``get_jobs_requirements`` returning the ``JobRecord`` of each job, with its requirements interned in
+    the ``vocabulary`` of the request. Once recorded, the job dicts are no longer referenced & can be released.
+    """
+    jobs = await get_jobs_requirements(session, jobs, deadline=deadline)
+    return [JobRecord.from_dict(job, vocabulary) for job in jobs]
+
+
+async def iter_job_records(session, jobs: list, vocabulary: TermVocabulary, deadline: Deadline = None):
+    """
+    Version of ``iter_jobs_requirements`` yielding the ``JobRecord`` of each job as soon as its requirements are
+    ready, with its requirements interned in the ``vocabulary`` of the request.
+    """
+    async for job in iter_jobs_requirements(session, jobs, deadline=deadline):
+        yield JobRecord.from_dict(job, vocabulary)
+
+
+@timed('score')
+async def get_matching_scores(employee_criteria: dict, jobs: list, vocabulary: TermVocabulary) -> list:
+    """
+    Calculate the matching score of the given job records, in their order. The descriptions are scored by the phrase
+    matcher in the NLP worker pool.
+    Raises ``PoolSaturatedError`` if the NLP worker pool can not accept the phrase matching.
+    """
+    if uses_phrase_matcher():
+        return (await nlp_pool.match_job_descriptions([employee_criteria], [job.description for job in jobs]))[0]
+    # A single criteria is scored job by job, building an index costs more than it saves
+    return calculate_records_scores(employee_criteria, jobs, vocabulary)
+
+
+async def rank_jobs(employee_criteria: dict, jobs: list, vocabulary: TermVocabulary):
+    """
+    Calculate the matching score of the given job records, then yield the records having a positive score one by one
+    so they are selected without building another list.
+    Raises ``PoolSaturatedError`` if the NLP worker pool can not accept the phrase matching.
+    """
+    matching_scores = await get_matching_scores(employee_criteria, jobs, vocabulary)
+    for job, matching_score in zip(jobs, matching_scores):
+        # Filter jobs based on score, ignore in case of being less than 0
+        if matching_score > 0:
+            job.score = matching_score
+            yield job
+
+
+@timed('score')
+async def score_profiles(employee_criteria_list: list, jobs: list, vocabulary: TermVocabulary) -> np.ndarray:
+    """
+    Calculate the matching score of the given job records for many employee criteria in one pass. Returns the matrix
+    of their scores, with a row per employee criteria & a column per job.
+    Raises ``PoolSaturatedError`` if the NLP worker pool can not accept the phrase matching.
+    """
+    if uses_phrase_matcher():
+        matching_scores = await nlp_pool.match_job_descriptions(employee_criteria_list,
+                                                                 [job.description for job in jobs])
+        return np.array(matching_scores, dtype=np.float64).reshape(len(employee_criteria_list), len(jobs))
+    return JobIndex.from_records(jobs, vocabulary).score_many(employee_criteria_list)
@@ -0,0 +1,50 @@
+import heapq
+import itertools
+from operator import attrgetter
+
+
+class TopKSelector:
+    """
+    Incremental selection of the ``k`` best scored items, fed batch by batch - e.g. the pages of a search - so only
+    the current best items are kept in memory instead of every candidate.
+
+    Items scoring 0 or less than ``min_score`` are dropped. The items are kept in a min-heap ordered by score, its
+    root is the worst of the kept items & is replaced when a better item comes. Without ``k`` every item is kept.
+    Ties are resolved in favor of the item pushed first.
+    """
+
+    def __init__(self, k: int = None, min_score: float = None, key=attrgetter('score')):
+        self.k = k
+        self.min_score = min_score
+        self.key = key
+        self.heap = []
+        self.count = 0
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def accepts(self, score: float) -> bool:
+        return score > 0 and (self.min_score is None or score >= self.min_score)
+
+    def push(self, item):
+        score = self.key(item)
+        if not self.accepts(score):
+            return
+        self.count += 1
+        # Later items rank after the earlier ones of the same score, so they are the first to be replaced
+        entry = (score, -next(self._sequence), item)
+        if self.k is None or len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def extend(self, items):
+        for item in items:
+            self.push(item)
+
+    def result(self) -> list:
+        """
+        Return the kept items, best score first.
+        """
+        return [item for _, _, item in sorted(self.heap, key=lambda entry: entry[:2], reverse=True)]
@@ -0,0 +1,94 @@
+from array import array
+
+from web import app
+from web.matching import NORMALIZERS, normalize_exact
+
+
+# Ways to include the job descriptions in the job listings
+DESCRIPTION_MODES = ('full', 'truncate', 'none')
+
+
+def truncate_description(description: str, length: int) -> str:
+    """
+    Cut the description to ``length`` characters at most, at the end of a word if possible.
+    """
+    if description is None or len(description) <= length:
+        return description
+    truncated = description[:length]
+    return (truncated.rsplit(None, 1)[0] if ' ' in truncated else truncated).rstrip() + '...'
+
+
+def format_listing(listing: dict, description: str = 'full', description_length: int = 200) -> dict:
+    """
+    Return the job listing with its description kept, truncated or dropped according to the ``description`` mode.
+    """
+    if description == 'full':
+        return listing
+    listing = dict(listing)
+    if description == 'none':
+        listing.pop('description', None)
+    else:
+        listing['description'] = truncate_description(listing.get('description'), description_length)
+    return listing
+
+
+class TermVocabulary:
+    """
+    Interns the normalized requirement terms of many jobs as consecutive integer ids, so each job only keeps an
+    array of 8 bytes ids instead of a list of strings & the repeated terms are stored once.
+    """
+
+    def __init__(self, mode: str = 'exact'):
+        self.mode = mode
+        self.normalize = NORMALIZERS[mode]
+        self.ids = {}
+
+    @classmethod
+    def from_config(cls) -> 'TermVocabulary':
+        return cls(app.config['MATCHING_MODE'])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def intern(self, terms) -> array:
+        if self.normalize is not normalize_exact:
+            terms = map(self.normalize, terms)
+        ids = self.ids
+        return array('q', [ids.setdefault(term, len(ids)) for term in terms])
+
+
+class JobRecord:
+    """
+    Compact record of a scored job, holding its requirements as interned term ids.
+    """
+
+    __slots__ = ('link', 'title', 'company', 'location', 'time', 'description', 'term_ids', 'score')
+
+    def __init__(self, link: str, title: str, company: str, location: str = None, time: str = None,
+                 description: str = None, term_ids: array = None, score: float = 0.0):
+        self.link = link
+        self.title = title
+        self.company = company
+        self.location = location
+        self.time = time
+        self.description = description
+        self.term_ids = term_ids if term_ids is not None else array('q')
+        self.score = score
+
+    def __repr__(self):
+        return f'<JobRecord {self.link}>'
+
+    @classmethod
+    def from_dict(cls, job: dict, vocabulary: TermVocabulary = None) -> 'JobRecord':
+        """
+        Build the record of a job dict of the pipeline, its requirements are interned in the given vocabulary.
+        """
+        term_ids = None
+        if vocabulary is not None and job.get('requirements'):
+            term_ids = vocabulary.intern(job['requirements'])
+        return cls(job['link'], job['title'], job['company'], job.get('location'), job.get('time'),
+                   job.get('description'), term_ids)
+
+    def as_listing(self, description: str = 'full', description_length: int = 200) -> dict:
+        listing = {'title': self.title, 'company': self.company, 'score': self.score, 'description': self.description}
+        return format_listing(listing, description, description_length)
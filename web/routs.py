@@ -1,25 +1,74 @@
-from flask import request, url_for
-from flask_jwt_extended import create_access_token, get_jwt_identity
+import time
+from operator import itemgetter
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import request, url_for, g
+from flask_jwt_extended import create_access_token, get_jwt_identity, current_user
 
 import httpx
 
-from web import app, db
+from web import app, db, jwt
+from web.fetcher import fetcher
+from web.ingest import match_indexed_jobs
 from web.status import HTTPStatus
-from web.models import User, user_exists
+from web.models import User, MatchingTask, user_exists
+from web.cache import identity_cache
+from web.security import password_hasher
+from web.streaming import ndjson_response
+from web.metrics import registry, request_timings, request_duration, format_server_timing
 from web.decerators import jwt_required_v2
-from web.forms import SignupForm, LoginForm, JobMatchingForm
-from web.parser import parse_search_response, get_detail_responses
-from web.utils import extract_job_requirements, calculate_matching_score
+from web.workers import PoolSaturatedError
+from web.deadline import Deadline
+from web.ranking import TopKSelector
+from web.tasks import task_runner, TaskQueueFullError
+from web.forms import SignupForm, LoginForm, ListingsForm, JobMatchingForm, BulkMatchingForm, MatchingTaskForm
+from web.records import TermVocabulary
+from web.pipeline import get_search_results, get_job_records, iter_job_records, rank_jobs, score_profiles
+
+# Answered while a crashed NLP worker pool is replaced, the next requests run in the new pool
+POOL_RESTARTED_MESSAGE = 'The NLP worker pool restarted, try again later'
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started_at = time.perf_counter()
+    request_timings.set({})
+
+
+@app.after_request
+def record_request_metrics(response):
+    duration = time.perf_counter() - g.get('request_started_at', time.perf_counter())
+    request_duration.observe(duration, endpoint=request.endpoint, method=request.method, status=response.status_code)
+    # Expose the time spent in each stage of the request to the client
+    if app.config['SERVER_TIMING']:
+        timings = dict(request_timings.get() or {}, total=duration)
+        response.headers['Server-Timing'] = format_server_timing(timings)
+    return response
+
+
+@app.route('/metrics', methods=['GET'], endpoint='metrics')
+def metrics():
+    return registry.render(), HTTPStatus.OK, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+@jwt.user_lookup_loader
+def load_user(jwt_header, jwt_data):
+    # Available as `current_user` in the JWT protected endpoints, the request is rejected if the user is not found
+    return identity_cache.get(jwt_data[app.config['JWT_IDENTITY_CLAIM']])
 
 
 @app.route('/api/auth/login', methods=['POST'], endpoint='login')
-def login():
+async def login():
     form = LoginForm(request.form)
     if form.validate():
         email, password = form.email.data, form.password.data
-        user = user_exists(email=email, password=password)
-        if not user:
+        user = user_exists(email=email)
+        # Verify the password away from the request thread, even if the user does not exist
+        if not await password_hasher.verify_async(user.password if user else None, password):
             return {'message': 'Invalid email or password'}, HTTPStatus.UNAUTHORIZED
+        if password_hasher.needs_rehash(user.password):
+            user.password = await password_hasher.hash_async(password)
+            db.session.commit()
         access_token = create_access_token(identity=user.id)
         user_info = user.as_dict()
         user_info.update({'access_token': access_token})
@@ -28,14 +77,15 @@ def login():
 
 
 @app.route('/api/auth/signup', methods=['POST'], endpoint='signup')
-def signup():
+async def signup():
     form = SignupForm(request.form)
     if form.validate():
-        email, password = form.email.data, form.password.data
-        user = user_exists(email=email, password=password)
+        user = user_exists(email=form.email.data)
         if user:
             return {'message': 'Email already exists'}, HTTPStatus.CONFLICT
-        user = User.create_user(**form.as_dict())
+        user_data = form.as_dict()
+        user_data['password_hash'] = await password_hasher.hash_async(user_data.pop('password'))
+        user = User.create_user(**user_data)
         db.session.add(user)
         db.session.commit()
         return {'message': 'User has successfully created', 'login': url_for('login', _external=True)}, HTTPStatus.CREATED
@@ -49,19 +99,16 @@ def delete():
     if not user_id:
         return {'message': 'User ID is required'}, HTTPStatus.BAD_REQUEST
 
-    current_user = get_jwt_identity()
     if not current_user:
         return {'message': 'User not found'}, HTTPStatus.NOT_FOUND
 
-    user = db.session.get(User, current_user)
-    if not user:
-        return {'message': 'User not found'}, HTTPStatus.NOT_FOUND
-
-    if user.id != int(user_id):
+    if current_user.id != int(user_id):
         return {'message': 'You can only delete your own account'}, HTTPStatus.FORBIDDEN
 
-    db.session.delete(user)
+    # Delete by the primary key without loading the user
+    User.query.filter_by(id=current_user.id).delete()
     db.session.commit()
+    identity_cache.invalidate(current_user.id)
 
     return {'message': 'User has successfully delete'}, HTTPStatus.OK
 
@@ -76,31 +123,183 @@ async def job_matching():
 
     # Extract data from the form
     start = form.start.data
+    limit = form.limit.data
     keywords = form.keywords.data
     location = form.location.data
 
-    api_url = f'https://www.linkedin.com/jobs-guest/jobs/api/seeMoreJobPostings/search?keywords={keywords}&location={location}&start={start}'
-    async with httpx.AsyncClient() as HttpxAsyncClient:
-        req = HttpxAsyncClient.build_request("GET", api_url)
-        # Send the request to get the search result
-        response = await HttpxAsyncClient.send(req)
-        # Parse the result
-        parsed_response = parse_search_response(response)
-        # Send other requests to get the details
-        jobs = await get_detail_responses(parsed_response)
-
-        # Iterate over jobs and extract job requirements, then calculate the  matching score
-        job_list = []
-        for job in jobs:
-            description = job.get('description', None)
-            if description is None:
-                continue
-            job_requirements = extract_job_requirements(description)
-            matching_score = calculate_matching_score(form.employee_criteria, job_requirements)
-            # Filter jobs based on score, ignore in case of being less than 0
-            if matching_score > 0:
-                job_list.append({'title': job['title'], 'company': job['company'], 'score': matching_score,
-                                 'description': description})
-
-        # Return sorted job listings as JSON response
-        return {'job_listings': sorted(job_list, key=lambda i: i.get('score'))}, HTTPStatus.OK
+    # Answer from the precomputed job index instead of scraping LinkedIn
+    if form.source.data == 'index':
+        selector = form.get_selector(key=itemgetter('score'))
+        selector.extend(match_indexed_jobs(form.employee_criteria))
+        return form.format_listings(selector.result()), HTTPStatus.OK
+
+    # Stages running out of time are cut short, the jobs scored so far are returned as partial results
+    deadline = Deadline.from_config()
+    async with fetcher.session() as session:
+        # Send the request to get the search result & parse it
+        try:
+            jobs = await get_search_results(session, keywords, location, start, limit, deadline)
+        except httpx.HTTPError:
+            return {'message': 'Failed to fetch the search results'}, HTTPStatus.BAD_GATEWAY
+        # Get the description & requirements of the jobs as records, then calculate their matching score
+        vocabulary = TermVocabulary.from_config()
+        selector = form.get_selector()
+        try:
+            jobs = await get_job_records(session, jobs, vocabulary, deadline)
+            async for job in rank_jobs(form.employee_criteria, jobs, vocabulary):
+                selector.push(job)
+        except PoolSaturatedError as exc:
+            return {'message': str(exc)}, HTTPStatus.SERVICE_UNAVAILABLE, {'Retry-After': '1'}
+        except BrokenProcessPool:
+            return {'message': POOL_RESTARTED_MESSAGE}, HTTPStatus.SERVICE_UNAVAILABLE, {'Retry-After': '1'}
+
+        # Return the requested page of the best job listings as JSON response
+        return dict(form.format_listings(selector.result()), partial=deadline.partial), HTTPStatus.OK
+
+
+@app.route("/api/job-matching/bulk", methods=['POST'], endpoint='bulk_job_matching')
+@jwt_required_v2
+async def bulk_job_matching():
+    form = BulkMatchingForm(request.form)
+
+    if not form.validate():
+        return {'message': form.errors}, HTTPStatus.BAD_REQUEST
+
+    # Search & analyze the jobs once for all the profiles
+    deadline = Deadline.from_config()
+    async with fetcher.session() as session:
+        try:
+            jobs = await get_search_results(session, form.keywords.data, form.location.data, form.start.data,
+                                            form.limit.data, deadline)
+        except httpx.HTTPError:
+            return {'message': 'Failed to fetch the search results'}, HTTPStatus.BAD_GATEWAY
+        employee_criteria_list = form.employee_criteria_list
+        vocabulary = TermVocabulary.from_config()
+        try:
+            jobs = await get_job_records(session, jobs, vocabulary, deadline)
+            # Score every profile against every job at once, then rank the jobs of each profile
+            matching_scores = await score_profiles(employee_criteria_list, jobs, vocabulary)
+        except PoolSaturatedError as exc:
+            return {'message': str(exc)}, HTTPStatus.SERVICE_UNAVAILABLE, {'Retry-After': '1'}
+        except BrokenProcessPool:
+            return {'message': POOL_RESTARTED_MESSAGE}, HTTPStatus.SERVICE_UNAVAILABLE, {'Retry-After': '1'}
+
+    job_listings = [job.as_listing() for job in jobs]
+    profiles = []
+    for employee_criteria, profile_scores in zip(employee_criteria_list, matching_scores.tolist()):
+        selector = form.get_selector(key=itemgetter(1))
+        selector.extend(enumerate(profile_scores))
+        ranked_listings = [dict(job_listings[index], score=score) for index, score in selector.result()]
+        profiles.append(dict(form.format_listings(ranked_listings), employee_criteria=employee_criteria))
+    return {'jobs': len(jobs), 'partial': deadline.partial, 'profiles': profiles}, HTTPStatus.OK
+
+
+async def stream_job_matching(employee_criteria, keywords, location, start, limit=None, top_k=None, min_score=None,
+                              **listing_options):
+    """
+    Yield a `job` frame per matched job as soon as it is scored, then a `summary` frame with the ids of the ``top_k``
+    best jobs sorted the same way as the `job_matching` listings, ``partial`` if the request ran out of time.
+    The ``listing_options`` are passed to ``Job.as_listing``.
+    """
+    deadline = Deadline.from_config()
+    async with fetcher.session() as session:
+        try:
+            parsed_response = await get_search_results(session, keywords, location, start, limit, deadline)
+        except httpx.HTTPError:
+            yield {'event': 'error', 'message': 'Failed to fetch the search results'}
+            return
+
+        # Keep the ids & scores of the best jobs only, their listings are already sent
+        selector = TopKSelector(top_k, min_score, key=itemgetter(1))
+        # The requirements of the streamed jobs are interned in the same vocabulary
+        vocabulary = TermVocabulary.from_config()
+        try:
+            async for job in iter_job_records(session, parsed_response, vocabulary, deadline):
+                async for job_record in rank_jobs(employee_criteria, [job], vocabulary):
+                    if not selector.accepts(job_record.score):
+                        continue
+                    job_id = selector.count
+                    yield {'event': 'job', 'id': job_id, 'job': job_record.as_listing(**listing_options)}
+                    selector.push((job_id, job_record.score))
+        except PoolSaturatedError as exc:
+            yield {'event': 'error', 'message': str(exc)}
+            return
+        except BrokenProcessPool:
+            yield {'event': 'error', 'message': POOL_RESTARTED_MESSAGE}
+            return
+
+        ranking = [job_id for job_id, _ in selector.result()]
+        yield {'event': 'summary', 'count': selector.count, 'ranking': ranking, 'partial': deadline.partial}
+
+
+@app.route("/api/job-matching/stream", methods=['GET'], endpoint='job_matching_stream')
+@jwt_required_v2
+def job_matching_stream():
+    form = JobMatchingForm(request.form)
+
+    if not form.validate():
+        return {'message': form.errors}, HTTPStatus.BAD_REQUEST
+
+    # Stream the matched jobs as newline delimited JSON frames
+    return ndjson_response(stream_job_matching(form.employee_criteria, form.keywords.data, form.location.data,
+                                               form.start.data, form.limit.data, top_k=form.top_k.data,
+                                               min_score=form.min_score.data, description=form.description.data,
+                                               description_length=form.description_length.data))
+
+
+@app.route("/api/job-matching/tasks", methods=['POST'], endpoint='create_matching_task')
+@jwt_required_v2
+def create_matching_task():
+    form = MatchingTaskForm(request.form)
+
+    if not form.validate():
+        return {'message': form.errors}, HTTPStatus.BAD_REQUEST
+
+    # Save the task, then run it in the background & answer right away
+    task = MatchingTask(user_id=get_jwt_identity(), params=form.as_params())
+    db.session.add(task)
+    db.session.commit()
+    try:
+        task_runner.submit(task)
+    except TaskQueueFullError as exc:
+        db.session.delete(task)
+        db.session.commit()
+        return {'message': str(exc)}, HTTPStatus.SERVICE_UNAVAILABLE, {'Retry-After': '10'}
+
+    location = url_for('matching_task', task_id=task.id)
+    return task.as_dict(), HTTPStatus.ACCEPTED, {'Location': location}
+
+
+def get_user_task(task_id):
+    task = db.session.get(MatchingTask, task_id)
+    if task is None or task.user_id != get_jwt_identity():
+        return None
+    return task
+
+
+@app.route("/api/job-matching/tasks/<task_id>", methods=['GET'], endpoint='matching_task')
+@jwt_required_v2
+def matching_task(task_id):
+    form = ListingsForm(request.values)
+
+    if not form.validate():
+        return {'message': form.errors}, HTTPStatus.BAD_REQUEST
+
+    task = get_user_task(task_id)
+    if task is None:
+        return {'message': 'Task not found'}, HTTPStatus.NOT_FOUND
+    # Page the job listings matched so far, the ranking refers to all of them
+    response = task.as_dict()
+    response.update(form.format_listings(response['job_listings']))
+    return response, HTTPStatus.OK
+
+
+@app.route("/api/job-matching/tasks/<task_id>", methods=['DELETE'], endpoint='cancel_matching_task')
+@jwt_required_v2
+def cancel_matching_task(task_id):
+    task = get_user_task(task_id)
+    if task is None:
+        return {'message': 'Task not found'}, HTTPStatus.NOT_FOUND
+    if not task_runner.cancel(task):
+        return {'message': f'The task is already {task.status}'}, HTTPStatus.CONFLICT
+    return task.as_dict(), HTTPStatus.OK
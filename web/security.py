@@ -0,0 +1,83 @@
+import hmac
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from web import app
+
+
+HASH_METHOD = 'pbkdf2:sha256'
+
+
+def is_password_hash(value: str) -> bool:
+    """
+    Whether the saved password has the ``method$salt$hash`` shape of the werkzeug hashes, of any method. Only the
+    values that cannot be a hash are compared as plain text, so a stolen hash is never accepted as its own password.
+    """
+    return value.count('$') >= 2
+
+
+class PasswordHasher:
+    """
+    Hashes & verifies the passwords with PBKDF2, whose cost is set by the ``PASSWORD_HASH_ITERATIONS`` option.
+
+    Hashing is slow on purpose, so the asynchronous versions run it in a pool of ``max_workers`` threads - hashlib
+    releases the GIL meanwhile - to keep it off the request thread & bound the CPU spent on concurrent logins.
+    Passwords saved in plain text before hashing was introduced, without any ``$``, are still accepted, ``needs_rehash`` tells whether
+    a saved password should be hashed again with the current cost.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._dummy_hash = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='password-hash')
+            return self._executor
+
+    @property
+    def method(self) -> str:
+        return f'{HASH_METHOD}:{app.config["PASSWORD_HASH_ITERATIONS"]}'
+
+    def hash(self, password: str) -> str:
+        return generate_password_hash(password, method=self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """
+        Check the password against the saved hash, or against a dummy hash if no user was found so that unknown
+        emails take as long as wrong passwords.
+        """
+        if password_hash is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hash('')
+            check_password_hash(self._dummy_hash, password)
+            return False
+        if not is_password_hash(password_hash):
+            return hmac.compare_digest(password_hash.encode(), password.encode())
+        return check_password_hash(password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return not password_hash.startswith(self.method + '$')
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.hash, password)
+
+    async def verify_async(self, password_hash: str, password: str) -> bool:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.verify, password_hash, password)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+password_hasher = PasswordHasher(max_workers=app.config['PASSWORD_HASH_WORKERS'])
+
@@ -0,0 +1,39 @@
+import json
+import asyncio
+
+from flask import Response, current_app
+
+
+def iterate_async(async_iterable):
+    """
+    Iterate over an asynchronous iterable from synchronous code, e.g. the body of a WSGI response which is consumed
+    after the view has returned. The iterable runs on its own event loop, closed once the iteration is over.
+    """
+    loop = asyncio.new_event_loop()
+    iterator = async_iterable.__aiter__()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        if hasattr(iterator, 'aclose'):
+            loop.run_until_complete(iterator.aclose())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+def ndjson_response(async_iterable, status: int = 200) -> Response:
+    """
+    Stream the items of an asynchronous iterable as newline delimited JSON.
+    The iterable runs within a new application context, the one of the view is gone by the time it is consumed.
+    """
+    app = current_app._get_current_object()
+
+    def generate():
+        with app.app_context():
+            for item in iterate_async(async_iterable):
+                yield json.dumps(item) + '\n'
+
+    return Response(generate(), status=status, mimetype='application/x-ndjson')
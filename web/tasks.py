@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from web import app, db
+from web.fetcher import fetcher
+from web.cache import job_cache
+from web.models import MatchingTask
+from web.workers import PoolSaturatedError
+from web.ranking import TopKSelector
+from web.records import JobRecord, TermVocabulary
+from web.pipeline import (get_search_results, get_jobs_requirements, extract_requirements, uses_phrase_matcher,
+                          rank_jobs)
+
+
+logger = logging.getLogger(__name__)
+
+# Longest wait in seconds between two attempts to analyze the jobs of a task
+MAX_RETRY_DELAY = 30
+
+
+class TaskQueueFullError(Exception):
+    """
+    Raised when the maximum number of tasks are already waiting or running.
+    """
+
+
+class MatchingTaskRunner:
+    """
+    Runs the job matching tasks in a pool of ``max_workers`` threads, each task on its own event loop.
+
+    A task searches its jobs by batches of ``batch_size`` & analyzes them by chunks of ``chunk_size``, the progress
+    & the job listings found so far are saved after each chunk, so they can be polled by any web worker sharing the
+    database. Tasks are cancelled by marking them as cancelled in the database, the running task stops before its
+    next chunk. While the NLP worker pool is saturated, the analysis of a chunk is retried up to ``max_retries``
+    times with a growing delay, then the task fails. At most ``max_pending`` tasks are accepted at the same time, the
+    extra ones are rejected with ``TaskQueueFullError``.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 32, batch_size: int = 250, chunk_size: int = 25,
+                 max_retries: int = 5, stale_after: float = 600):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.stale_after = stale_after
+        self.futures = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='matching-task')
+            return self._executor
+
+    def submit(self, task: MatchingTask):
+        """
+        Schedule the given saved task. Raises ``TaskQueueFullError`` if the runner can not accept more tasks.
+        """
+        with self._lock:
+            self.futures = {task_id: future for task_id, future in self.futures.items() if not future.done()}
+            if len(self.futures) >= self.max_pending:
+                raise TaskQueueFullError('Too many job matching tasks are in progress, try again later')
+        future = self.executor.submit(self.run, task.id)
+        with self._lock:
+            self.futures[task.id] = future
+
+    def cancel(self, task: MatchingTask) -> bool:
+        """
+        Cancel the given task unless it is finished, returns whether it is cancelled.
+        """
+        if task.is_finished:
+            return False
+        task.status = MatchingTask.CANCELLED
+        task.finished_at = datetime.utcnow()
+        db.session.commit()
+        future = self.futures.get(task.id)
+        if future is not None:
+            future.cancel()
+        return True
+
+    def run(self, task_id: str):
+        with app.app_context():
+            try:
+                asyncio.run(self.process(task_id))
+            except Exception as exc:
+                logger.exception('Job matching task %s failed', task_id)
+                db.session.rollback()
+                self.finish(db.session.get(MatchingTask, task_id), MatchingTask.FAILED, str(exc))
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def finish(task: MatchingTask, status: str, error: str = None):
+        if task is None or task.is_finished:
+            return
+        task.status = status
+        task.error = error
+        task.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    @staticmethod
+    def is_cancelled(task: MatchingTask) -> bool:
+        # The task may be cancelled by a request served by another process
+        db.session.refresh(task)
+        return task.status == MatchingTask.CANCELLED
+
+    async def analyze(self, task: MatchingTask, jobs: list, vocabulary: TermVocabulary,
+                      results: TopKSelector) -> bool:
+        """
+        Extract the requirements of the given jobs, then push their records ranked for the task into the ``results``.
+        The analysis is retried with a growing delay while the NLP worker pool is saturated. Returns False if the task
+        is cancelled meanwhile. Raises ``PoolSaturatedError`` once the retries are exhausted.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                if not uses_phrase_matcher():
+                    job_cache.save(await extract_requirements(jobs))
+                job_records = [JobRecord.from_dict(job, vocabulary) for job in jobs]
+                # The scores are calculated before the first record is yielded, a retry pushes nothing twice
+                async for job in rank_jobs(task.params['employee_criteria'], job_records, vocabulary):
+                    results.push(job)
+                return True
+            except PoolSaturatedError:
+                if attempt == self.max_retries:
+                    raise
+            await asyncio.sleep(min(2 ** attempt, MAX_RETRY_DELAY))
+            if self.is_cancelled(task):
+                return False
+
+    async def process(self, task_id: str):
+        task = db.session.get(MatchingTask, task_id)
+        if task is None or task.is_finished:
+            return
+        params = task.params
+        task.status = MatchingTask.RUNNING
+        task.total = params['limit']
+        db.session.commit()
+
+        # Only the best listings are kept across the batches
+        results = TopKSelector(params.get('top_k'), params.get('min_score'))
+        # The requirements of all the batches are interned in the same vocabulary
+        vocabulary = TermVocabulary.from_config()
+        async with fetcher.session() as session:
+            for offset in range(0, params['limit'], self.batch_size):
+                if self.is_cancelled(task):
+                    return
+                limit = min(self.batch_size, params['limit'] - offset)
+                try:
+                    jobs = await get_search_results(session, params['keywords'], params['location'],
+                                                    params['start'] + offset, limit)
+                except httpx.HTTPError as exc:
+                    if not results:
+                        raise RuntimeError('Failed to fetch the search results') from exc
+                    # Keep the listings matched so far
+                    logger.warning('Job matching task %s stopped at offset %d: %s', task_id, offset, exc)
+                    break
+                for chunk_offset in range(0, len(jobs), self.chunk_size):
+                    if self.is_cancelled(task):
+                        return
+                    # The fetched details are cached, so only the analysis is retried while the pool is saturated
+                    chunk = await get_jobs_requirements(session, jobs[chunk_offset:chunk_offset + self.chunk_size],
+                                                        extract=False)
+                    if not await self.analyze(task, chunk, vocabulary, results):
+                        return
+                    task.progress = offset + min(chunk_offset + self.chunk_size, len(jobs))
+                    task.results = [job.as_listing() for job in results.result()]
+                    db.session.commit()
+
+                task.progress = offset + limit
+                db.session.commit()
+                # The search has no more jobs
+                if len(jobs) < limit:
+                    break
+
+        if not self.is_cancelled(task):
+            task.progress = task.total
+            self.finish(task, MatchingTask.SUCCEEDED)
+
+    def recover(self) -> int:
+        """
+        Mark as failed the tasks left pending or running by a stopped or crashed process, recognized by not being
+        updated for ``stale_after`` seconds, so they are not polled forever. Returns the number of failed tasks.
+        """
+        with app.app_context():
+            now = datetime.utcnow()
+            count = MatchingTask.query.filter(
+                MatchingTask.status.in_((MatchingTask.PENDING, MatchingTask.RUNNING)),
+                MatchingTask.updated_at < now - timedelta(seconds=self.stale_after),
+            ).update({'status': MatchingTask.FAILED, 'error': 'The task was interrupted', 'finished_at': now},
+                     synchronize_session=False)
+            db.session.commit()
+        if count:
+            logger.warning('Marked %d interrupted job matching tasks as failed', count)
+        return count
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures = dict(self.futures)
+        if executor is None:
+            return
+        executor.shutdown(wait=wait, cancel_futures=True)
+        # The tasks still waiting in the queue are dropped with the executor
+        dropped = [task_id for task_id, future in futures.items() if future.cancelled()]
+        if dropped:
+            with app.app_context():
+                tasks = MatchingTask.query.filter(MatchingTask.id.in_(dropped),
+                                                  MatchingTask.status == MatchingTask.PENDING)
+                tasks.update({'status': MatchingTask.FAILED, 'error': 'The server stopped before running the task',
+                              'finished_at': datetime.utcnow()}, synchronize_session=False)
+                db.session.commit()
+
+
+task_runner = MatchingTaskRunner(
+    max_workers=app.config['TASK_WORKERS'],
+    max_pending=app.config['TASK_QUEUE_SIZE'],
+    batch_size=app.config['SEARCH_PAGE_SIZE'] * app.config['SEARCH_MAX_PAGES'],
+    chunk_size=app.config['SEARCH_PAGE_SIZE'],
+    max_retries=app.config['TASK_MAX_RETRIES'],
+    stale_after=app.config['TASK_STALE_AFTER'],
+)
@@ -1,8 +1,71 @@
+import gc
+import time
+import logging
+import threading
+
 import spacy
 
+from web import app
+from web.metrics import timed, startup_duration
+
+
+logger = logging.getLogger(__name__)
+
+# Spacy English language model, loaded on first use by `get_nlp`
+nlp = None
+nlp_lock = threading.Lock()
+
+# Components needed to produce named entities & noun chunks, noun chunks rely on the dependency parse and
+# the coarse-grained POS tags set by the attribute ruler, everything else (e.g. lemmatizer) can be skipped
+REQUIRED_COMPONENTS = ('tok2vec', 'tagger', 'attribute_ruler', 'parser', 'ner')
+
+
+def get_nlp():
+    """
+    Return the Spacy language model, loading it on the first call. Loading takes seconds & hundreds of megabytes,
+    so the processes that never extract requirements (e.g. the auth tests) do not pay for it.
+    """
+    global nlp
+    if nlp is None:
+        with nlp_lock:
+            if nlp is None:
+                started_at = time.perf_counter()
+                language = spacy.load(app.config['NLP_MODEL'])
+                duration = time.perf_counter() - started_at
+                startup_duration.set(duration, phase='nlp_model')
+                logger.info('Loaded the Spacy model %s in %.2fs', app.config['NLP_MODEL'], duration)
+                nlp = language
+    return nlp
+
+
+def preload_nlp():
+    """
+    Load the Spacy model up front, before a pre-fork server (e.g. gunicorn --preload) forks its workers so they
+    share the model pages copy-on-write. The loaded objects are moved out of the garbage collector's reach, otherwise
+    its passes write to them & copy the pages in every worker.
+    """
+    language = get_nlp()
+    gc.freeze()
+    return language
+
+
+def get_disabled_components(language=None):
+    """
+    Return the names of the pipeline components that are not needed to extract job requirements.
+    """
+    language = language or get_nlp()
+    return [name for name in language.pipe_names if name not in REQUIRED_COMPONENTS]
 
-# Load Spacy English language model
-nlp = spacy.load("en_core_web_sm")
+
+# Function to collect the important named entities and noun phrases from an analyzed document
+def get_doc_requirements(doc):
+    """
+    Given a document processed by Spacy, this function returns a list of the extracted named entities
+    (ORG, PRODUCT & PERSON) followed by the noun phrases.
+    """
+    entities = [entity.text for entity in doc.ents if entity.label_ in ["ORG", "PRODUCT", "PERSON"]]
+    noun_chunks = [chunk.text for chunk in doc.noun_chunks]
+    return entities + noun_chunks
 
 
 # Function to extract important named entities and noun phrases from job description
@@ -14,13 +77,22 @@ def extract_job_requirements(job_description):
     The function uses Spacy's English language model to perform named entity recognition and noun chunking.
     Returns a list of extracted named entities and noun phrases.
     """
-    # Analyze job description with Spacy
-    doc = nlp(job_description)
-    # Extract named entities and noun phrases
-    entities = [entity.text for entity in doc.ents if entity.label_ in ["ORG", "PRODUCT", "PERSON"]]
-    noun_chunks = [chunk.text for chunk in doc.noun_chunks]
-    # Return extracted named entities and noun phrases
-    return entities + noun_chunks
+    # Analyze job description with Spacy & return extracted named entities and noun phrases
+    return extract_jobs_requirements([job_description])[0]
+
+
+# Function to extract important named entities and noun phrases from many job descriptions at once
+@timed('nlp_extract')
+def extract_jobs_requirements(job_descriptions, batch_size=None, n_process=1):
+    """
+    Given a list of job descriptions, this function extracts the important named entities and noun phrases of each one.
+    The descriptions are streamed through Spacy's `nlp.pipe` in batches - optionally over several processes - with the
+    pipeline components that are not needed for named entity recognition and noun chunking disabled.
+    Returns a list of extracted requirements per description, in the same order as the given descriptions.
+    """
+    docs = get_nlp().pipe(job_descriptions, batch_size=batch_size, n_process=n_process,
+                          disable=get_disabled_components())
+    return [get_doc_requirements(doc) for doc in docs]
 
 
 # Function to calculate matching score based on employee criteria and job requirements
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from web import app
+from web import utils
+from web.matcher import match_many_job_descriptions
+from web.metrics import timed
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturatedError(Exception):
+    """
+    Raised when the worker pool already has the maximum number of pending tasks.
+    """
+
+
+def init_worker():
+    """
+    Initializer of the worker processes, loads the Spacy model once so the submitted tasks reuse it. Workers forked
+    from a process that preloaded the model inherit it instead.
+    """
+    utils.extract_jobs_requirements(['warm up'])
+
+
+class NLPWorkerPool:
+    """
+    Pool of worker processes running the Spacy extraction & phrase matching away from the event loop & the GIL of
+    the web worker.
+
+    With ``max_workers`` set to 0 the tasks run in a thread pool instead.
+    At most ``max_pending`` tasks are accepted at the same time, the extra ones are rejected with
+    ``PoolSaturatedError`` so clients can back off instead of queueing behind every other request. A task holds its
+    slot until the pool is done with it, even if the request stops waiting for it. A process pool broken by a dying
+    worker, e.g. killed for using too much memory, is replaced by a new one.
+    """
+
+    def __init__(self, max_workers: int = 0, max_pending: int = 64, batch_size: int = 32, n_process: int = 1):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.pending = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.max_workers <= 0:
+                    self._executor = ThreadPoolExecutor(thread_name_prefix='nlp')
+                else:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=init_worker)
+            return self._executor
+
+    def acquire(self):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise PoolSaturatedError('The NLP worker pool is saturated, try again later')
+            self.pending += 1
+
+    def release(self):
+        with self._lock:
+            self.pending -= 1
+
+    def reset_executor(self, executor: Executor):
+        """
+        Drop the given executor if it is still the pool's one, so the next task creates a new one.
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, func, *args, **kwargs) -> tuple:
+        """
+        Submit the function to the executor, replacing it first if it is broken. Returns the executor & the future.
+        """
+        executor = self.executor
+        try:
+            return executor, executor.submit(func, *args, **kwargs)
+        except BrokenProcessPool:
+            logger.warning('The NLP worker pool is broken, starting a new one')
+            self.reset_executor(executor)
+            executor = self.executor
+            return executor, executor.submit(func, *args, **kwargs)
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run the function in the pool & return its result. Raises ``PoolSaturatedError`` if the pool can not accept
+        more tasks, or ``BrokenProcessPool`` if a worker process died while running it.
+        """
+        self.acquire()
+        try:
+            executor, future = self.submit(func, *args, **kwargs)
+        except BaseException:
+            self.release()
+            raise
+        # Released once the task is over, cancelling the waiting request does not stop a running task
+        future.add_done_callback(lambda _: self.release())
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            # The other tasks of the broken pool fail too, the next ones run in a new pool
+            logger.warning('A worker process of the NLP pool died, starting a new pool')
+            self.reset_executor(executor)
+            raise
+
+    @timed('nlp')
+    async def extract_jobs_requirements(self, job_descriptions: list) -> list:
+        """
+        Extract the requirements of the given job descriptions in the pool, see ``utils.extract_jobs_requirements``.
+        Raises ``PoolSaturatedError`` if the pool can not accept more tasks.
+        """
+        if not job_descriptions:
+            return []
+        # Nested process pools are not allowed inside the worker processes
+        n_process = self.n_process if self.max_workers <= 0 else 1
+        return await self.run(utils.extract_jobs_requirements, job_descriptions, batch_size=self.batch_size,
+                              n_process=n_process)
+
+    async def match_job_descriptions(self, employee_criteria_list: list, job_descriptions: list) -> list:
+        """
+        Score the job descriptions for each employee criteria with the phrase matcher in the pool, see
+        ``matcher.match_many_job_descriptions``. Raises ``PoolSaturatedError`` if the pool can not accept more tasks.
+        """
+        if not job_descriptions:
+            return [[] for _ in employee_criteria_list]
+        return await self.run(match_many_job_descriptions, employee_criteria_list, job_descriptions)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+nlp_pool = NLPWorkerPool(
+    max_workers=app.config['NLP_WORKERS'],
+    max_pending=app.config['NLP_QUEUE_SIZE'],
+    batch_size=app.config['NLP_BATCH_SIZE'],
+    n_process=app.config['NLP_N_PROCESS'],
+)